@@ -0,0 +1,208 @@
+"""Streaming backup and restore of the license database.
+
+export writes one gzip-compressed NDJSON file per collection, in MongoDB
+Extended JSON so ObjectIds and dates survive the round trip. Documents are
+read in _id order in batches and written line by line, so memory use does not
+grow with the collection. With --incremental, collections that carry an
+updated_at field only export documents changed since the previous export to
+the same directory (tracked in manifest.json); the others are small and are
+exported in full every time. Deletions are not captured by incremental
+exports, so a restore can bring back documents deleted since the last full
+export.
+
+import upserts the files back by _id in batched unordered bulk writes, oldest
+export first, so a full export followed by its incrementals restores the
+latest state. It also accepts the old export-mongo.js dumps (licenses.json,
+users.json, ...), converting their string _ids and ISO dates.
+
+    python backup.py export backups/                        # full export
+    python backup.py export backups/ --incremental          # changes since the last export
+    python backup.py export backups/ licenses users
+    python backup.py import backups/                        # every export in the directory
+    python backup.py import backups/licenses-20250101T000000Z.ndjson.gz
+    python backup.py import ../licenses.json --dry-run      # legacy dump, count only
+
+After an import, rebuild the dashboard counters (POST /api/dashboard/stats/rebuild)
+and restart the API so in-process caches pick up the restored keys.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from bson import ObjectId, json_util
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from server import DATE_FIELDS, apply_date_range, client, db, parse_legacy_date
+
+logger = logging.getLogger("backup")
+
+# Derived or short-lived collections (stats, locks, revocations, raw events,
+# migration checkpoints) are rebuilt by the server and left out by default
+DEFAULT_COLLECTIONS = ["users", "products", "licenses", "settings", "payment_events", "verification_hourly"]
+
+# Collections whose documents are stamped on every change: every write to them
+# in server.py, update_many calls included, sets updated_at
+WATERMARK_FIELDS = {"licenses": "updated_at", "settings": "updated_at"}
+
+# Overlap between incremental exports, covering writes in flight when the last one started
+WATERMARK_MARGIN = timedelta(minutes=5)
+
+MANIFEST = "manifest.json"
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+
+def read_manifest(directory: Path) -> dict:
+    path = directory / MANIFEST
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def write_manifest(directory: Path, manifest: dict):
+    tmp = directory / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, directory / MANIFEST)
+
+
+async def export_collection(name: str, directory: Path, batch_size: int, since: datetime = None) -> int:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    suffix = "-incremental" if since else ""
+    path = directory / f"{name}-{stamp}{suffix}.ndjson.gz"
+    tmp = path.with_suffix(".tmp")
+
+    query = apply_date_range({}, WATERMARK_FIELDS[name], gte=since) if since else {}
+    exported = 0
+    with gzip.open(tmp, "wt", encoding="utf-8") as out:
+        async for doc in db[name].find(query).sort("_id", 1).batch_size(batch_size):
+            out.write(json_util.dumps(doc, json_options=JSON_OPTIONS))
+            out.write("\n")
+            exported += 1
+            if exported % (batch_size * 20) == 0:
+                logger.info(f"{name}: {exported} documents exported so far")
+    os.replace(tmp, path)
+    logger.info(f"{name}: {exported} documents -> {path}")
+    return exported
+
+
+async def export(args):
+    directory = Path(args.path)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(directory)
+
+    for name in args.collections or DEFAULT_COLLECTIONS:
+        started = datetime.now(timezone.utc)
+        since = None
+        entry = manifest.get(name, {})
+        if args.incremental and name in WATERMARK_FIELDS and entry.get("watermark"):
+            since = datetime.fromisoformat(entry["watermark"]) - WATERMARK_MARGIN
+        elif args.incremental:
+            logger.info(f"{name}: no watermark field or previous export, exporting in full")
+
+        exported = await export_collection(name, directory, args.batch_size, since)
+        manifest[name] = {"watermark": started.isoformat(), "last_count": exported, "incremental": since is not None}
+        write_manifest(directory, manifest)
+
+
+def read_ndjson(path: Path):
+    with gzip.open(path, "rt", encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                yield json_util.loads(line, json_options=JSON_OPTIONS)
+
+
+def read_legacy_json(path: Path, name: str):
+    """export-mongo.js dumps: one JSON array, _id as a hex string, dates as ISO strings.
+
+    These files are loaded whole; they were only ever written for small collections.
+    """
+    for doc in json.loads(path.read_text()):
+        if isinstance(doc.get("_id"), str) and ObjectId.is_valid(doc["_id"]):
+            doc["_id"] = ObjectId(doc["_id"])
+        for field in DATE_FIELDS.get(name, []):
+            if isinstance(doc.get(field), str):
+                doc[field] = parse_legacy_date(doc[field])
+        yield doc
+
+
+def collection_for(path: Path) -> str:
+    # licenses-20250101T000000Z.ndjson.gz, licenses-...-incremental.ndjson.gz or licenses.json
+    return path.name.split(".")[0].split("-")[0]
+
+
+async def flush(name: str, requests: list) -> int:
+    try:
+        await db[name].bulk_write(requests, ordered=False)
+        return 0
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        for error in errors[:5]:
+            logger.warning(f"{name}: {error.get('errmsg')}")
+        return len(errors)
+
+
+async def import_file(path: Path, batch_size: int, dry_run: bool) -> int:
+    name = collection_for(path)
+    docs = read_legacy_json(path, name) if path.suffix == ".json" else read_ndjson(path)
+
+    restored = 0
+    failed = 0
+    requests = []
+    for doc in docs:
+        restored += 1
+        if dry_run:
+            continue
+        requests.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        if len(requests) >= batch_size:
+            failed += await flush(name, requests)
+            requests = []
+    if requests:
+        failed += await flush(name, requests)
+
+    verb = "would restore" if dry_run else "restored"
+    logger.info(f"{name}: {verb} {restored - failed} documents from {path.name}" + (f", {failed} failed" if failed else ""))
+    return restored - failed
+
+
+async def restore(args):
+    path = Path(args.path)
+    if path.is_dir():
+        # Timestamps in the names put every full export before its incrementals
+        files = sorted(path.glob("*.ndjson.gz"), key=lambda f: f.name.split("-", 1)[1])
+    else:
+        files = [path]
+    if args.collections:
+        files = [f for f in files if collection_for(f) in args.collections]
+
+    for file in files:
+        await import_file(file, args.batch_size, args.dry_run)
+
+
+async def main(args):
+    try:
+        await (export(args) if args.command == "export" else restore(args))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write collections to gzip NDJSON files")
+    export_parser.add_argument("path", help="output directory")
+    export_parser.add_argument("collections", nargs="*", metavar="collection")
+    export_parser.add_argument("--incremental", action="store_true",
+                               help="only documents changed since the last export to this directory")
+    export_parser.add_argument("--batch-size", type=int, default=1000)
+
+    import_parser = commands.add_parser("import", help="upsert documents from an export directory or file")
+    import_parser.add_argument("path", help="export directory, .ndjson.gz file or legacy .json dump")
+    import_parser.add_argument("collections", nargs="*", metavar="collection")
+    import_parser.add_argument("--batch-size", type=int, default=500)
+    import_parser.add_argument("--dry-run", action="store_true", help="only count the documents")
+
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,347 @@
+"""Load test for the API hot paths: verify, login, license listing and dashboard.
+
+Seeds a dedicated database (default: license_loadtest) with the requested
+volumes, then drives a weighted mix of requests from concurrent async clients.
+It reports throughput and p50/p95/p99 latency per endpoint. By default the app
+runs in-process through its ASGI interface against MONGO_URL, so the numbers
+cover the app and the database without HTTP parsing. --url targets a running
+server instead, which must use the same database. --in-memory swaps MongoDB
+for mongomock-motor: useful for smoke runs with small volumes, but not
+representative, since every query blocks the event loop.
+
+    python benchmarks/load.py                                   # 100k licenses, 10k users, 30 s
+    python benchmarks/load.py --licenses 10000 --duration 10 --concurrency 20
+    python benchmarks/load.py --mix verify=80,login=5,licenses=10,dashboard=5
+    python benchmarks/load.py --output results/$(git rev-parse --short HEAD).json
+    python benchmarks/load.py --baseline results/main.json      # exit 1 on regression
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PASSWORD = "loadtest-password"
+ADMIN_EMAIL = "loadtest-admin@example.com"
+SEED_BATCH = 5000
+
+DEFAULT_MIX = "verify=60,verify_invalid=10,login=5,licenses=15,dashboard=10"
+
+
+def use_in_memory_mongo():
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("--in-memory needs mongomock-motor (pip install mongomock-motor)")
+    import motor.motor_asyncio
+
+    class InMemoryClient(AsyncMongoMockClient):
+        def __init__(self, *args, **kwargs):
+            # mongomock only understands a subset of the client options
+            super().__init__(tz_aware=kwargs.get("tz_aware", False))
+
+    motor.motor_asyncio.AsyncIOMotorClient = InMemoryClient
+
+
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[rank]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def seed(server, args, rng: random.Random):
+    """(Re)create the seed data unless the database already holds the requested volumes."""
+    db = server.db
+    meta = await db.loadtest_meta.find_one({"id": "seed"})
+    wanted = {"licenses": args.licenses, "users": args.users, "products": args.products}
+    if meta and not args.reseed and all(meta.get(k) == v for k, v in wanted.items()):
+        logging.info(f"Reusing seeded data: {wanted}")
+        return
+
+    started = time.perf_counter()
+    for name in ("licenses", "users", "products", "stats", "loadtest_meta"):
+        await db[name].drop()
+    await server.ensure_indexes()
+
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    # One bcrypt hash for everyone: seeding 10k real hashes would take minutes
+    password_hash = server.hash_password(PASSWORD)
+
+    products = [
+        {"id": str(uuid.uuid4()), "name": f"Produto {i}", "description": None, "version": "1.0.0",
+         "created_at": now - timedelta(days=i)}
+        for i in range(args.products)
+    ]
+    await db.products.insert_many(products)
+
+    user_ids = []
+    for start in range(0, args.users, SEED_BATCH):
+        batch = [
+            {"id": str(uuid.uuid4()), "email": f"user{i}@loadtest.example.com", "password_hash": password_hash,
+             "role": "user", "created_at": now - timedelta(minutes=i)}
+            for i in range(start, min(args.users, start + SEED_BATCH))
+        ]
+        await db.users.insert_many(batch)
+        user_ids.extend(user["id"] for user in batch)
+    await db.users.insert_one({"id": str(uuid.uuid4()), "email": ADMIN_EMAIL, "password_hash": password_hash,
+                               "role": "admin", "created_at": now})
+
+    statuses = ["active"] * 9 + ["inactive"]
+    for start in range(0, args.licenses, SEED_BATCH):
+        batch = []
+        for i in range(start, min(args.licenses, start + SEED_BATCH)):
+            product = rng.choice(products)
+            expiration = now + timedelta(days=rng.randint(-60, 730))
+            # Already swept, so the expiration sweeper has no backlog competing with the run
+            status = "expired" if expiration < now else rng.choice(statuses)
+            batch.append({
+                "id": str(uuid.uuid4()),
+                "license_key": str(uuid.uuid4()),
+                "client_name": f"Cliente {i}",
+                "domain": f"site{i}.example.com",
+                "product_id": product["id"],
+                "product_name": product["name"],
+                "user_id": rng.choice(user_ids) if user_ids else str(uuid.uuid4()),
+                "expiration_date": expiration,
+                "status": status,
+                "created_at": now - timedelta(minutes=i),
+                "updated_at": now,
+            })
+        await db.licenses.insert_many(batch)
+        logging.info(f"Seeded {min(args.licenses, start + SEED_BATCH)}/{args.licenses} licenses")
+
+    await server.rebuild_dashboard_stats()
+    await db.loadtest_meta.insert_one({"id": "seed", **wanted})
+    logging.info(f"Seeding took {time.perf_counter() - started:.1f} s")
+
+
+async def sample_targets(server, rng: random.Random, size: int = 5000):
+    licenses = await server.db.licenses.aggregate([
+        {"$sample": {"size": size}},
+        {"$project": {"_id": 0, "license_key": 1, "domain": 1, "product_name": 1}},
+    ]).to_list(None)
+    users = await server.db.users.aggregate([
+        {"$match": {"role": "user"}},
+        {"$sample": {"size": min(size, 1000)}},
+        {"$project": {"_id": 0, "email": 1}},
+    ]).to_list(None)
+    return licenses, [user["email"] for user in users]
+
+
+def build_operations(licenses, emails, admin_headers):
+    def verify(rng):
+        lic = rng.choice(licenses)
+        return "POST", "/api/verify", {"json": {"license_key": lic["license_key"], "domain": lic["domain"],
+                                               "product_name": lic["product_name"]}}
+
+    def verify_invalid(rng):
+        return "POST", "/api/verify", {"json": {"license_key": str(uuid.uuid4()), "domain": "pirate.example.com",
+                                               "product_name": "Produto 0"}}
+
+    def login(rng):
+        return "POST", "/api/auth/login", {"json": {"email": rng.choice(emails), "password": PASSWORD}}
+
+    def list_licenses(rng):
+        params = {"limit": 50, "sort": rng.choice(["created_at", "expiration_date", "client_name"]),
+                  "order": rng.choice(["asc", "desc"])}
+        if rng.random() < 0.3:
+            params["status"] = "active"
+        return "GET", "/api/licenses", {"params": params, "headers": admin_headers}
+
+    def dashboard(rng):
+        return "GET", "/api/dashboard/stats", {"headers": admin_headers}
+
+    return {"verify": verify, "verify_invalid": verify_invalid, "login": login,
+            "licenses": list_licenses, "dashboard": dashboard}
+
+
+async def run_workload(http, operations, mix, args):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    measuring = asyncio.Event()
+    deadline = time.perf_counter() + args.warmup + args.duration
+
+    async def client(worker: int):
+        rng = random.Random(args.seed * 1000 + worker)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            method, path, kwargs = operations[name](rng)
+            started = time.perf_counter()
+            try:
+                response = await http.request(method, path, **kwargs)
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            finished = time.perf_counter()
+            elapsed_ms = (finished - started) * 1000
+            # Requests still in flight at the deadline are dropped, keeping the throughput honest
+            if measuring.is_set() and finished <= deadline:
+                latencies[name].append(elapsed_ms)
+                statuses[name][status] += 1
+
+    async def start_measuring():
+        await asyncio.sleep(args.warmup)
+        measuring.set()
+
+    await asyncio.gather(start_measuring(), *(client(i) for i in range(args.concurrency)))
+    return latencies, statuses
+
+
+def summarize(latencies, statuses, duration: float) -> dict:
+    endpoints = {}
+    everything = []
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        everything.extend(values)
+        errors = sum(count for status, count in statuses[name].items() if not status.startswith("2"))
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": errors,
+            "throughput_rps": round(len(values) / duration, 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2) if values else 0.0,
+            "statuses": dict(statuses[name]),
+        }
+    everything.sort()
+    total = {
+        "requests": len(everything),
+        "throughput_rps": round(len(everything) / duration, 2),
+        "p50_ms": round(percentile(everything, 50), 2),
+        "p95_ms": round(percentile(everything, 95), 2),
+        "p99_ms": round(percentile(everything, 99), 2),
+    }
+    return {"endpoints": endpoints, "total": total}
+
+
+def print_report(summary: dict):
+    print(f"{'endpoint':<16}{'reqs':>8}{'errors':>8}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, row in summary["endpoints"].items():
+        print(f"{name:<16}{row['requests']:>8}{row['errors']:>8}{row['throughput_rps']:>10.1f}"
+              f"{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}")
+    total = summary["total"]
+    print(f"{'total':<16}{total['requests']:>8}{'':>8}{total['throughput_rps']:>10.1f}"
+          f"{total['p50_ms']:>9.1f}{total['p95_ms']:>9.1f}{total['p99_ms']:>9.1f}")
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> bool:
+    """Print the change against a baseline run; False when an endpoint got slower or slower-moving beyond tolerance."""
+    ok = True
+    print(f"\nvs baseline {baseline.get('commit', '?')} (tolerance {tolerance:.0%})")
+    for name, row in summary["endpoints"].items():
+        base = baseline["results"]["endpoints"].get(name)
+        if not base or not base["requests"]:
+            continue
+        p95_change = row["p95_ms"] / base["p95_ms"] - 1 if base["p95_ms"] else 0.0
+        rps_change = row["throughput_rps"] / base["throughput_rps"] - 1 if base["throughput_rps"] else 0.0
+        regressed = p95_change > tolerance or rps_change < -tolerance
+        ok = ok and not regressed
+        print(f"{name:<16} p95 {p95_change:+7.1%}  rps {rps_change:+7.1%}  {'REGRESSION' if regressed else 'ok'}")
+    return ok
+
+
+async def main(args):
+    os.environ["DB_NAME"] = args.db
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    # The point is to measure the handlers, not the throttling in front of them
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    if args.in_memory:
+        os.environ["SETTINGS_CHANGE_STREAM"] = "false"
+        use_in_memory_mongo()
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import httpx
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    rng = random.Random(args.seed)
+    mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+
+    await seed(server, args, rng)
+    if args.url:
+        http = httpx.AsyncClient(base_url=args.url, timeout=30,
+                                 limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        await server.app.router.startup()
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://loadtest", timeout=30)
+
+    try:
+        login = await http.post("/api/auth/login", json={"email": ADMIN_EMAIL, "password": PASSWORD})
+        login.raise_for_status()
+        admin_headers = {"Authorization": f"Bearer {login.json()['token']}"}
+        licenses, emails = await sample_targets(server, rng)
+        operations = build_operations(licenses, emails, admin_headers)
+        unknown = set(mix) - set(operations)
+        if unknown:
+            sys.exit(f"Unknown workloads in --mix: {', '.join(sorted(unknown))}")
+
+        logging.info(f"Running {args.concurrency} clients for {args.duration:.0f} s (+{args.warmup:.0f} s warm-up)")
+        latencies, statuses = await run_workload(http, operations, mix, args)
+    finally:
+        await http.aclose()
+        if not args.url:
+            await server.app.router.shutdown()
+
+    summary = summarize(latencies, statuses, args.duration)
+    print_report(summary)
+    if not summary["total"]["requests"]:
+        logging.warning("No request completed inside the measured window; raise --duration or lower the volumes")
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "results": summary,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(result, indent=2))
+        print(f"\nResults written to {args.output}")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if not compare(summary, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--licenses", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--products", type=int, default=20)
+    parser.add_argument("--reseed", action="store_true", help="drop and reseed even if the volumes match")
+    parser.add_argument("--db", default="license_loadtest", help="database to seed and test (it gets dropped!)")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before the measurement")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="comma-separated workload=weight")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for data and request choice")
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--in-memory", action="store_true", help="use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with a previous --output file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p95/throughput change vs baseline")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,110 @@
+"""Micro-benchmark: serializing a 10k-row license list, standard path vs fast path.
+
+Both paths serve the same prebuilt rows (shaped like Mongo returns them) from
+in-process FastAPI routes, so only framework, validation and JSON encoding
+are measured. No database is needed.
+
+- "standard": the route returns dicts and FastAPI validates each row through
+  response_model=List[License] before encoding it.
+- "fast": the route returns list_response(), which uses orjson and skips
+  per-row models (what FAST_JSON_RESPONSES=true enables).
+
+    python benchmarks/serialization.py
+    python benchmarks/serialization.py --rows 50000 --repeat 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "license_benchmark")
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Response  # noqa: E402
+
+import server  # noqa: E402
+from server import License, list_response  # noqa: E402
+
+
+def make_rows(count: int) -> List[dict]:
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    product_id = str(uuid.uuid4())
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "license_key": str(uuid.uuid4()),
+            "client_name": f"Cliente {i}",
+            "domain": f"site{i}.example.com",
+            "product_id": product_id,
+            "product_name": "Produto A",
+            "user_id": str(uuid.uuid4()),
+            "expiration_date": now + timedelta(days=i % 365),
+            "status": "active",
+            "created_at": now - timedelta(minutes=i),
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+def build_app(rows: List[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/standard", response_model=List[License])
+    async def standard():
+        return rows
+
+    @app.get("/fast", response_model=List[License])
+    async def fast(response: Response):
+        return list_response(rows, License, "licenses", response)
+
+    return app
+
+
+async def measure(http: httpx.AsyncClient, path: str, repeat: int):
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = await http.get(path)
+        body = response.content
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, body
+
+
+async def main(args):
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server.FAST_JSON_RESPONSES = True
+    rows = make_rows(args.rows)
+    transport = httpx.ASGITransport(app=build_app(rows))
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+        # Warm-up builds the route's validators and caches
+        await http.get("/standard")
+        await http.get("/fast")
+        standard, standard_body = await measure(http, "/standard", args.repeat)
+        fast, fast_body = await measure(http, "/fast", args.repeat)
+
+    same = httpx.Response(200, content=standard_body).json() == httpx.Response(200, content=fast_body).json()
+    standard_ms, fast_ms = statistics.median(standard), statistics.median(fast)
+    print(f"{args.rows} rows, median of {args.repeat} requests")
+    print(f"standard (response_model + json): {standard_ms:8.1f} ms  {len(standard_body):>10} bytes")
+    print(f"fast (projection + orjson):       {fast_ms:8.1f} ms  {len(fast_body):>10} bytes")
+    print(f"speedup: {standard_ms / fast_ms:.1f}x, identical JSON: {same}")
+    if not same:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
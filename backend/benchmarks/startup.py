@@ -0,0 +1,117 @@
+"""Cold-start benchmark: import of server.py to its first HTTP response.
+
+Every run is a fresh interpreter, like a serverless cold start. It times the
+module import (dotenv, models, routes, Mongo client) and the first request
+served through the ASGI app. Interpreter boot and the benchmark's own imports
+are reported separately as process time.
+
+    python benchmarks/startup.py                          # 10 runs, serverless mode
+    python benchmarks/startup.py --runs 20 --max-ms 600
+    python benchmarks/startup.py --path "/api/health?db=true"   # include the first Mongo round trip
+    python benchmarks/startup.py --mode server            # run the startup hooks too (needs MongoDB)
+
+Exits with status 1 when the median import-to-first-response time is above
+--max-ms, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import asyncio, json, sys, time
+import httpx  # the benchmark's client, not part of the measured cold start
+
+started = time.perf_counter()
+sys.path.insert(0, {backend_dir!r})
+import server
+imported = time.perf_counter()
+
+async def first_response():
+    if {run_startup!r}:
+        await server.app.router.startup()
+    ready = time.perf_counter()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+        response = await http.get({path!r})
+        response.raise_for_status()
+    if {run_startup!r}:
+        await server.app.router.shutdown()
+    return ready
+
+ready = asyncio.run(first_response())
+done = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_response_ms": (done - ready) * 1000,
+    "total_ms": (done - started) * 1000,
+}}))
+"""
+
+
+def run_once(args, env) -> dict:
+    code = CHILD.format(backend_dir=str(BACKEND_DIR), path=args.path, run_startup=args.mode == "server")
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    process_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        sys.exit(f"benchmark run failed:\n{result.stderr}")
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = process_ms
+    return sample
+
+
+def summarize(samples, metric) -> dict:
+    values = sorted(sample[metric] for sample in samples)
+    return {
+        "median": round(statistics.median(values), 2),
+        "p90": round(values[min(len(values) - 1, int(len(values) * 0.9))], 2),
+        "max": round(values[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/api/health")
+    parser.add_argument("--mode", choices=["serverless", "server"], default="serverless")
+    parser.add_argument("--max-ms", type=float, default=1500, help="fail when the median total_ms is above this")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["SERVERLESS"] = "1" if args.mode == "serverless" else "0"
+    # Motor connects lazily, so a placeholder URL is enough unless the path touches the database
+    env.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    env.setdefault("DB_NAME", "license_benchmark")
+
+    # The first run warms the OS file cache; it is not counted
+    run_once(args, env)
+    samples = [run_once(args, env) for _ in range(args.runs)]
+
+    metrics = ["import_ms", "startup_ms", "first_response_ms", "total_ms", "process_ms"]
+    summary = {metric: summarize(samples, metric) for metric in metrics}
+    print(f"{'metric':<20}{'median':>10}{'p90':>10}{'max':>10}")
+    for metric, values in summary.items():
+        print(f"{metric:<20}{values['median']:>10.1f}{values['p90']:>10.1f}{values['max']:>10.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump({"mode": args.mode, "path": args.path, "runs": args.runs, "summary": summary, "samples": samples}, fh, indent=2)
+
+    median = summary["total_ms"]["median"]
+    if median > args.max_ms:
+        print(f"FAIL: median import-to-first-response {median:.1f} ms > {args.max_ms:.0f} ms")
+        sys.exit(1)
+    print(f"OK: median import-to-first-response {median:.1f} ms <= {args.max_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
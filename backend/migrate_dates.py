@@ -0,0 +1,95 @@
+"""Rewrite legacy ISO string dates as native BSON datetimes.
+
+Older releases stored every date as an ISO string. This command walks each
+collection in _id order, converts the string fields listed in
+server.DATE_FIELDS and records a checkpoint after every batch, so it can be
+stopped and re-run at any time. The checkpoint is cleared once a collection
+has been scanned to the end, so the next run rescans it from the start and
+picks up strings written meanwhile by instances still on the old release.
+Once it reports nothing left to convert on every collection, set
+DATE_COMPAT_READS=false.
+
+    python migrate_dates.py                  # all collections
+    python migrate_dates.py licenses --batch-size 1000
+    python migrate_dates.py --restart        # ignore the checkpoint of an interrupted run
+    python migrate_dates.py --dry-run        # count pending documents only
+"""
+import argparse
+import asyncio
+import logging
+
+from pymongo import UpdateOne
+
+from server import DATE_FIELDS, client, db, parse_legacy_date
+
+logger = logging.getLogger("migrate_dates")
+
+CHECKPOINT_COLLECTION = "migrations"
+
+
+def pending_query(fields):
+    return {"$or": [{field: {"$type": "string"}} for field in fields]}
+
+
+async def migrate_collection(name: str, batch_size: int, restart: bool) -> int:
+    fields = DATE_FIELDS[name]
+    checkpoint_id = f"bson_dates:{name}"
+    checkpoints = db[CHECKPOINT_COLLECTION]
+
+    checkpoint = None if restart else await checkpoints.find_one({"id": checkpoint_id})
+    last_id = checkpoint.get("last_id") if checkpoint else None
+    converted = 0
+
+    projection = {field: 1 for field in fields}
+    while True:
+        query = pending_query(fields)
+        if last_id is not None:
+            query = {"$and": [query, {"_id": {"$gt": last_id}}]}
+        batch = await db[name].find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            # Finished: a checkpoint left behind would make the next run skip everything
+            await checkpoints.delete_one({"id": checkpoint_id})
+            break
+
+        requests = []
+        for doc in batch:
+            update = {
+                field: parse_legacy_date(doc[field])
+                for field in fields
+                if isinstance(doc.get(field), str)
+            }
+            if update:
+                requests.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if requests:
+            await db[name].bulk_write(requests, ordered=False)
+
+        converted += len(requests)
+        last_id = batch[-1]["_id"]
+        await checkpoints.update_one(
+            {"id": checkpoint_id},
+            {"$set": {"last_id": last_id}, "$inc": {"converted": len(requests)}},
+            upsert=True,
+        )
+        logger.info(f"{name}: {converted} documents converted so far")
+
+    return converted
+
+
+async def main(args):
+    for name in args.collections or list(DATE_FIELDS):
+        if args.dry_run:
+            pending = await db[name].count_documents(pending_query(DATE_FIELDS[name]))
+            logger.info(f"{name}: {pending} documents with string dates")
+            continue
+        converted = await migrate_collection(name, args.batch_size, args.restart)
+        logger.info(f"{name}: done, {converted} documents converted")
+    client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("collections", nargs="*", choices=list(DATE_FIELDS), metavar="collection")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--restart", action="store_true", help="ignore saved checkpoints")
+    parser.add_argument("--dry-run", action="store_true", help="only count documents still holding string dates")
+    asyncio.run(main(parser.parse_args()))
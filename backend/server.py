@@ -1,40 +1,262 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, BackgroundTasks, HTTPException, Depends, File, Header, Query, Response, UploadFile, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import json_util
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 import os
+import re
+import base64
+import csv
+import io
+import socket
+import asyncio
+import bisect
+import contextvars
+import functools
+import json
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import Any, Dict, Hashable, List, Literal, Optional, Tuple
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 import uuid
+import hashlib
+import hmac
+import math
 from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
 import jwt
+try:
+    import orjson
+except ImportError:  # optional: only needed for FAST_JSON_RESPONSES
+    orjson = None
+# passlib, httpx and cryptography are imported on first use to keep cold starts short
 
 ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+if (ROOT_DIR / '.env').exists():
+    from dotenv import load_dotenv
+    load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
+# Serverless deployments (Vercel) serve each request from a short-lived function:
+# no startup work or background tasks (see /api/maintenance/cron) and smaller pools
+SERVERLESS = os.environ.get('SERVERLESS', '1' if os.environ.get('VERCEL') else '0') == '1'
 
-db = client[os.environ['DB_NAME']]
+# ============= INSTRUMENTATION =============
+
+# Request and MongoDB command metrics, served by /api/metrics. SLOW_REQUEST_MS > 0
+# logs slower requests with the time they spent in Mongo and bcrypt
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+# Bearer token for Prometheus scrapes; without it /api/metrics needs an admin login
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '0'))
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Prometheus-style histogram per label tuple. Thread-safe: Mongo commands report from Motor's threads."""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.series: Dict[tuple, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), sum, count
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> List[Tuple[tuple, List[int], float, int]]:
+        """(labels, cumulative bucket counts, sum, count) for every series."""
+        with self.lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.series.items()]
+        result = []
+        for labels, counts, total, count in series:
+            cumulative = []
+            running = 0
+            for bucket_count in counts:
+                running += bucket_count
+                cumulative.append(running)
+            result.append((labels, cumulative, total, count))
+        return result
+
+# Time spent per phase ("db", "password_hash") by the current request: phase -> [seconds, calls].
+# Motor copies the context into its executor threads, so the dict is shared with them
+request_phases: contextvars.ContextVar[Optional[Dict[str, list]]] = contextvars.ContextVar('request_phases', default=None)
+request_phases_lock = threading.Lock()
+
+def record_phase(phase: str, seconds: float):
+    phases = request_phases.get()
+    if phases is None:
+        return
+    with request_phases_lock:
+        totals = phases.setdefault(phase, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Times every MongoDB command by collection and command name."""
+
+    def __init__(self):
+        self.durations = Histogram()
+        self.failures = Counter()
+        self.lock = threading.Lock()
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        # getMore names its collection separately; admin commands (ping) have none
+        collection = target if isinstance(target, str) else event.command.get('collection', '-')
+        with self.lock:
+            self._collections[(event.connection_id, event.request_id)] = str(collection)
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
 
+    def _finish(self, event, failed: bool):
+        with self.lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), '-')
+            if failed:
+                self.failures[(collection, event.command_name)] += 1
+        seconds = event.duration_micros / 1e6
+        self.durations.observe((collection, event.command_name), seconds)
+        record_phase("db", seconds)
+
+mongo_commands = MongoCommandListener()
+
+# MongoDB connection
+mongo_url = os.environ.get('MONGO_URL')
 if not mongo_url:
     print("FATAL ERROR: MONGO_URL está faltando. Verifique as Variáveis de Ambiente no Vercel.")
     raise ValueError("MONGO_URL não configurada.")
-client = AsyncIOMotorClient(mongo_url)
+
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '10' if SERVERLESS else '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+# Motor only connects on the first operation, and warm invocations reuse this client.
+# tz_aware: dates are stored as native BSON datetimes and come back as aware UTC values
+client = AsyncIOMotorClient(
+    mongo_url,
+    tz_aware=True,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    event_listeners=[mongo_commands] if METRICS_ENABLED else [],
+)
+db = client[os.environ['DB_NAME']]
+# Dates written by older releases are ISO strings; keep dual reads on until
+# migrate_dates.py has rewritten every collection, then set this to false
+DATE_COMPAT_READS = os.environ.get('DATE_COMPAT_READS', 'true').lower() == 'true'
+
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with a different cost are transparently rehashed on the next successful login
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+# bcrypt runs on its own small pool so logins never block the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '32'))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
 security = HTTPBearer()
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production-xyz123')
 ALGORITHM = "HS256"
 
+# Verification cache
+VERIFY_CACHE_SIZE = int(os.environ.get('VERIFY_CACHE_SIZE', '10000'))
+VERIFY_CACHE_TTL = float(os.environ.get('VERIFY_CACHE_TTL', '60'))
+VERIFY_BATCH_MAX_ITEMS = int(os.environ.get('VERIFY_BATCH_MAX_ITEMS', '1000'))
+
+# Bulk license operations: rows per create request, ids per update_many
+LICENSE_BULK_MAX_ITEMS = int(os.environ.get('LICENSE_BULK_MAX_ITEMS', '1000'))
+LICENSE_BULK_UPDATE_CHUNK = int(os.environ.get('LICENSE_BULK_UPDATE_CHUNK', '1000'))
+
+# List endpoints serialize rows straight from Mongo with orjson instead of
+# validating each one through its Pydantic model; same JSON, less CPU
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'false').lower() == 'true' and orjson is not None
+
+# Dashboard "expiring soon" counts are the only stats not maintained incrementally
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', '60'))
+
+# Offline license tokens (Ed25519-signed JWTs). LICENSE_SIGNING_KEY holds a PEM
+# private key; without it /verify/token and /verify/public-key answer 503, since a
+# key generated per process (per cold start, per replica) fails the client's pinned key
+LICENSE_SIGNING_KEY = os.environ.get('LICENSE_SIGNING_KEY')
+LICENSE_TOKEN_TTL = int(os.environ.get('LICENSE_TOKEN_TTL', '86400'))
+LICENSE_TOKEN_ISSUER = "license-manager"
+
+# Negative cache of license keys (Bloom filter) in front of POST /verify
+VERIFY_BLOOM_ENABLED = os.environ.get('VERIFY_BLOOM_ENABLED', 'true').lower() == 'true'
+BLOOM_ERROR_RATE = float(os.environ.get('BLOOM_ERROR_RATE', '0.001'))
+BLOOM_MIN_CAPACITY = int(os.environ.get('BLOOM_MIN_CAPACITY', '100000'))
+BLOOM_REFRESH_INTERVAL = float(os.environ.get('BLOOM_REFRESH_INTERVAL', '10'))
+BLOOM_REBUILD_INTERVAL = float(os.environ.get('BLOOM_REBUILD_INTERVAL', '3600'))
+
+# Verification events are buffered in memory and written in batches; a full
+# buffer drops events instead of slowing down /verify
+VERIFY_EVENTS_ENABLED = os.environ.get('VERIFY_EVENTS_ENABLED', 'true').lower() == 'true'
+VERIFY_EVENTS_BUFFER = int(os.environ.get('VERIFY_EVENTS_BUFFER', '10000'))
+VERIFY_EVENTS_BATCH = int(os.environ.get('VERIFY_EVENTS_BATCH', '500'))
+VERIFY_EVENTS_FLUSH_INTERVAL = float(os.environ.get('VERIFY_EVENTS_FLUSH_INTERVAL', '2'))
+# Applied when the TTL indexes are first created
+VERIFY_EVENTS_RETENTION_DAYS = int(os.environ.get('VERIFY_EVENTS_RETENTION_DAYS', '30'))
+VERIFY_ROLLUP_RETENTION_DAYS = int(os.environ.get('VERIFY_ROLLUP_RETENTION_DAYS', '400'))
+
+# Rate limiting of public endpoints; budgets are '<requests>/<seconds>', '0' disables one.
+# RATE_LIMIT_PROXY_HOPS is the number of trusted proxies appending to X-Forwarded-For
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', '0'))
+RATE_LIMIT_MAX_BUCKETS = int(os.environ.get('RATE_LIMIT_MAX_BUCKETS', '100000'))
+
+# Settings are cached per process; the version is re-read at most every
+# SETTINGS_VERSION_CHECK_INTERVAL seconds unless a change stream pushes updates
+SETTINGS_VERSION_CHECK_INTERVAL = float(os.environ.get('SETTINGS_VERSION_CHECK_INTERVAL', '5'))
+SETTINGS_CHANGE_STREAM = os.environ.get('SETTINGS_CHANGE_STREAM', 'true').lower() == 'true'
+
+# Mercado Pago; MERCADOPAGO_API_URL can point at a local stub server
+MERCADOPAGO_API_URL = os.environ.get('MERCADOPAGO_API_URL', 'https://api.mercadopago.com')
+MERCADOPAGO_TIMEOUT = float(os.environ.get('MERCADOPAGO_TIMEOUT', '10'))
+MERCADOPAGO_MAX_CONNECTIONS = int(os.environ.get('MERCADOPAGO_MAX_CONNECTIONS', '20'))
+# Webhook notifications are queued in db.payment_events and applied by these workers
+PAYMENT_WORKERS = int(os.environ.get('PAYMENT_WORKERS', '2'))
+PAYMENT_EVENT_LEASE = float(os.environ.get('PAYMENT_EVENT_LEASE', '60'))
+PAYMENT_EVENT_MAX_ATTEMPTS = int(os.environ.get('PAYMENT_EVENT_MAX_ATTEMPTS', '8'))
+PAYMENT_POLL_INTERVAL = float(os.environ.get('PAYMENT_POLL_INTERVAL', '5'))
+PAYMENT_LICENSE_EXTENSION_DAYS = int(os.environ.get('PAYMENT_LICENSE_EXTENSION_DAYS', '365'))
+PAYMENT_CURRENCY = os.environ.get('PAYMENT_CURRENCY', 'BRL')
+FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+
+# Background jobs
+EXPIRATION_SWEEP_INTERVAL = float(os.environ.get('EXPIRATION_SWEEP_INTERVAL', '60'))
+# Bearer secret Vercel Cron sends to /api/maintenance/cron
+CRON_SECRET = os.environ.get('CRON_SECRET')
+# Identifies this process when competing for leader locks
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+STARTED_AT = time.monotonic()
+
+# Auth caches; PRINCIPAL_CACHE_TTL bounds how long a deleted user or role change
+# can go unnoticed on another replica
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', '10000'))
+PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL', '30'))
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', '10000'))
+TOKEN_CACHE_TTL = float(os.environ.get('TOKEN_CACHE_TTL', '300'))
+
 # Create the main app
 app = FastAPI()
-#api_router = APIRouter(prefix="/api")
-api_router = APIRouter()
+# Routes are built once with their final path and appended to the app below;
+# include_router would rebuild every route (dependencies and response schemas) a second time
+api_router = APIRouter(prefix="/api", dependency_overrides_provider=app)
 
 # ============= MODELS =============
 
@@ -60,12 +282,14 @@ class Product(BaseModel):
     name: str
     description: Optional[str] = None
     version: str = "1.0.0"
+    price: Optional[float] = None  # renewal price in PAYMENT_CURRENCY; None = not sold online
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class ProductCreate(BaseModel):
     name: str
     description: Optional[str] = None
     version: str = "1.0.0"
+    price: Optional[float] = Field(None, gt=0)
 
 class License(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -74,6 +298,7 @@ class License(BaseModel):
     client_name: str
     domain: str
     product_id: str
+    product_name: Optional[str] = None  # denormalized from products, kept in sync by update_product
     user_id: str
     expiration_date: datetime
     status: str = "active"  # active, inactive, expired
@@ -95,6 +320,23 @@ class LicenseUpdate(BaseModel):
     expiration_date: Optional[datetime] = None
     status: Optional[str] = None
 
+class LicenseBulkFilter(BaseModel):
+    ids: Optional[List[str]] = None
+    status: Optional[str] = None
+    product_id: Optional[str] = None
+    domain: Optional[str] = None
+    client_name: Optional[str] = None  # prefix match
+    expires_after: Optional[datetime] = None
+    expires_before: Optional[datetime] = None
+
+class LicenseBulkRenew(BaseModel):
+    filter: LicenseBulkFilter
+    extend_days: int = Field(gt=0, le=36500)
+
+class LicenseBulkStatus(BaseModel):
+    filter: LicenseBulkFilter
+    status: Literal["active", "inactive", "expired"]
+
 class LicenseVerifyRequest(BaseModel):
     license_key: str
     domain: str
@@ -105,6 +347,12 @@ class LicenseVerifyResponse(BaseModel):
     message: str
     license_data: Optional[dict] = None
 
+class LicenseTokenResponse(BaseModel):
+    valid: bool
+    message: str
+    token: Optional[str] = None
+    expires_at: Optional[datetime] = None
+
 class Settings(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: "settings")
@@ -112,6 +360,7 @@ class Settings(BaseModel):
     mercadopago_access_token: Optional[str] = None
     mercadopago_public_key: Optional[str] = None
     enable_payments: bool = False
+    version: int = 0
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class SettingsUpdate(BaseModel):
@@ -121,19 +370,354 @@ class SettingsUpdate(BaseModel):
     enable_payments: Optional[bool] = None
 
 class PaymentPreference(BaseModel):
+    # The amount charged is the product's price, never a client-supplied value
     title: str
     description: str
-    amount: float
     product_id: str
     license_id: str
 
+# ============= INDEXES =============
+
+# Every hot lookup path must be covered here; ensure_indexes() runs at startup
+INDEXES = {
+    "licenses": [
+        IndexModel([("license_key", ASCENDING)], name="license_key_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Keyset pagination: every list filter is followed by the (sort field, id) pair
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        IndexModel([("expiration_date", ASCENDING), ("id", ASCENDING)], name="expiration_date_id"),
+        IndexModel([("client_name", ASCENDING), ("id", ASCENDING)], name="client_name_id"),
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="user_id_created_at_id"),
+        IndexModel([("product_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="product_id_created_at_id"),
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="status_created_at_id"),
+        IndexModel([("status", ASCENDING), ("expiration_date", ASCENDING)], name="status_expiration_date"),
+        IndexModel([("domain", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="domain_created_at_id"),
+    ],
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+    ],
+    "locks": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "payment_events": [
+        IndexModel([("payment_id", ASCENDING)], name="payment_id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+    ],
+    "verification_events": [
+        IndexModel([("license_key", ASCENDING), ("at", ASCENDING)], name="license_key_at"),
+        IndexModel([("at", ASCENDING)], name="at_ttl", expireAfterSeconds=VERIFY_EVENTS_RETENTION_DAYS * 86400),
+    ],
+    "verification_hourly": [
+        IndexModel([("license_key", ASCENDING), ("hour", ASCENDING)], name="license_key_hour_unique", unique=True),
+        IndexModel([("product_id", ASCENDING), ("hour", ASCENDING)], name="product_id_hour"),
+        IndexModel([("hour", ASCENDING)], name="hour_ttl", expireAfterSeconds=VERIFY_ROLLUP_RETENTION_DAYS * 86400),
+    ],
+    "revocations": [
+        # The feed pages on (revoked_at, _id): a whole batch shares one revoked_at
+        IndexModel([("revoked_at", ASCENDING), ("_id", ASCENDING)], name="revoked_at_id"),
+        IndexModel([("key_hash", ASCENDING), ("revoked_at", ASCENDING), ("_id", ASCENDING)], name="key_hash_revoked_at_id"),
+        # Tokens never outlive LICENSE_TOKEN_TTL, so older revocations are dead weight
+        IndexModel([("expire_at", ASCENDING)], name="expire_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+async def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except PyMongoError as e:
+            # Usually duplicates in existing data; the app still works, just without the index
+            logger.error(f"Could not create indexes on {collection}: {str(e)}")
+
+async def backfill_product_names():
+    """Denormalize product names onto licenses written before product_name existed."""
+    async for product in db.products.find({}, {"_id": 0, "id": 1, "name": 1}):
+        await db.licenses.update_many(
+            {"product_id": product['id'], "product_name": {"$exists": False}},
+            # updated_at is the incremental backup watermark (backup.py)
+            {"$set": {"product_name": product['name'], "updated_at": datetime.now(timezone.utc)}}
+        )
+
+async def backfill_revocation_hashes(batch_size: int = 1000):
+    """Replace the plain license keys kept by older releases on revocations with their hash."""
+    while True:
+        docs = await db.revocations.find(
+            {"key_hash": {"$exists": False}}, {"_id": 1, "license_key": 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return
+        await db.revocations.bulk_write([
+            UpdateOne(
+                {"_id": doc['_id']},
+                {"$set": {"key_hash": license_key_hash(doc.get('license_key', ''))}, "$unset": {"license_key": ""}}
+            )
+            for doc in docs
+        ], ordered=False)
+
+# ============= CACHES =============
+
+class TTLCache:
+    """Bounded LRU cache with per-entry expiry and tag-based invalidation.
+
+    Tags let a write path drop every entry derived from one record (e.g. all
+    verdicts for a license key) without scanning the whole cache. The
+    generation counter is bumped on each invalidation so a reader that
+    started before it can refuse to store a value it read from stale data.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Hashable, Tuple[object, float, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+
+    def get(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value, ttl: Optional[float] = None,
+            tags: Tuple[str, ...] = (), generation: Optional[int] = None):
+        if generation is not None and generation != self.generation:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl, tuple(tags))
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        self.generation += 1
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_tag(self, tag: str):
+        self.generation += 1
+        for key in list(self._tags.get(tag, ())):
+            self._remove(key)
+            self.invalidations += 1
+
+    def clear(self):
+        self.generation += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._tags.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    def _remove(self, key: Hashable):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+class BloomFilter:
+    """Fixed-size probabilistic set: no false negatives, false positives near error_rate."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        # Double hashing (Kirsch-Mitzenmacher) from a single 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str):
+        positions = self._positions(item)
+        if all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in positions):
+            # Already present (refresh windows overlap); keep count close to distinct keys
+            return
+        for pos in positions:
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class LicenseKeyFilter:
+    """Bloom filter of every existing license key, so unknown keys are rejected without a query.
+
+    Until the first build finishes every key passes through. Keys created on
+    other replicas are picked up by refresh() through the created_at index;
+    deleted keys linger until the next full rebuild, which is harmless.
+    """
+
+    # Overlap between refresh windows, covering clock skew between replicas
+    CLOCK_SKEW = timedelta(seconds=30)
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.bloom: Optional[BloomFilter] = None
+        self.watermark: Optional[datetime] = None
+        self.rejected = 0
+        self.passed = 0
+        self.false_positives = 0
+        self.rebuilds = 0
+        self.last_rebuild_ms = 0.0
+
+    def might_exist(self, license_key: str) -> bool:
+        if self.bloom is None:
+            return True
+        if license_key in self.bloom:
+            self.passed += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_false_positive(self):
+        if self.bloom is not None:
+            self.false_positives += 1
+
+    def add(self, license_key: str):
+        if self.bloom is not None:
+            self.bloom.add(license_key)
+
+    @property
+    def needs_rebuild(self) -> bool:
+        return self.bloom is not None and self.bloom.count > self.bloom.capacity
+
+    async def rebuild(self):
+        started = time.perf_counter()
+        started_at = datetime.now(timezone.utc)
+        total = await db.licenses.estimated_document_count()
+        bloom = BloomFilter(max(BLOOM_MIN_CAPACITY, total * 2), BLOOM_ERROR_RATE)
+        async for doc in db.licenses.find({}, {"_id": 0, "license_key": 1}).batch_size(5000):
+            bloom.add(doc['license_key'])
+        self.bloom = bloom
+        self.watermark = started_at - self.CLOCK_SKEW
+        # Catch keys inserted while the scan was running
+        await self.refresh()
+        self.rebuilds += 1
+        self.last_rebuild_ms = (time.perf_counter() - started) * 1000
+        logger.info(f"License key filter rebuilt: {bloom.count} keys in {self.last_rebuild_ms:.1f} ms")
+
+    async def refresh(self):
+        if self.bloom is None:
+            return
+        now = datetime.now(timezone.utc)
+        query = apply_date_range({}, 'created_at', gte=self.watermark)
+        async for doc in db.licenses.find(query, {"_id": 0, "license_key": 1}):
+            self.bloom.add(doc['license_key'])
+        self.watermark = now - self.CLOCK_SKEW
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "ready": self.bloom is not None,
+            "keys": self.bloom.count if self.bloom else 0,
+            "capacity": self.bloom.capacity if self.bloom else 0,
+            "size_bytes": len(self.bloom.bits) if self.bloom else 0,
+            "error_rate": BLOOM_ERROR_RATE,
+            "rejected": self.rejected,
+            "passed": self.passed,
+            "false_positives": self.false_positives,
+            "rebuilds": self.rebuilds,
+            "last_rebuild_ms": round(self.last_rebuild_ms, 2),
+        }
+
+license_key_filter = LicenseKeyFilter(VERIFY_BLOOM_ENABLED)
+
+# Verdicts of POST /verify keyed on (license_key, domain, product_name)
+verify_cache = TTLCache(VERIFY_CACHE_SIZE, VERIFY_CACHE_TTL)
+
+def invalidate_license_verdicts(license_key: str):
+    verify_cache.invalidate_tag(f"license:{license_key}")
+
+def invalidate_product_verdicts(product_id: str):
+    verify_cache.invalidate_tag(f"product:{product_id}")
+
+# Decoded JWT payloads keyed by the raw token, and User principals keyed by id
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
 # ============= AUTH HELPERS =============
 
+@functools.lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS,
+    )
+
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; also returns a new hash when the stored one uses another cost factor."""
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+_pending_password_jobs = 0
+
+async def run_password_job(fn, *args):
+    """Run a bcrypt call on the password pool, shedding load with 503 once the queue is full."""
+    global _pending_password_jobs
+    if _pending_password_jobs >= PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Server busy, try again later",
+            headers={"Retry-After": "1"}
+        )
+    _pending_password_jobs += 1
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, functools.partial(fn, *args))
+    finally:
+        _pending_password_jobs -= 1
+        # Includes the wait for a free worker, which is where a login storm shows up
+        record_phase("password_hash", time.perf_counter() - started)
 
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(days=7)):
     to_encode = data.copy()
@@ -142,19 +726,34 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(days=7)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_access_token(token: str) -> dict:
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Never serve a memoized payload past the token's own expiry
+        token_cache.set(token, payload, ttl=payload.get("exp", 0) - time.time())
+    return payload
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        user_doc = await db.users.find_one({"id": user_id}, {"_id": 0})
+        user = principal_cache.get(user_id)
+        if user is not None:
+            return user
+        
+        generation = principal_cache.generation
+        user_doc = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
         if user_doc is None:
             raise HTTPException(status_code=401, detail="User not found")
         
-        return User(**user_doc)
+        user = User(**user_doc)
+        principal_cache.set(user_id, user, generation=generation)
+        return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except Exception:
@@ -165,6 +764,136 @@ async def get_admin_user(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
+# ============= DATES =============
+
+# Date fields per collection, as rewritten by migrate_dates.py
+DATE_FIELDS = {
+    "licenses": ["created_at", "updated_at", "expiration_date"],
+    "users": ["created_at"],
+    "products": ["created_at"],
+    "settings": ["updated_at"],
+}
+
+def parse_legacy_date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def coerce_dates(doc: dict, fields: List[str]) -> dict:
+    """Dual-read shim: turn legacy ISO string dates into datetimes where Python compares them."""
+    if DATE_COMPAT_READS:
+        for field in fields:
+            if isinstance(doc.get(field), str):
+                doc[field] = parse_legacy_date(doc[field])
+    return doc
+
+def apply_date_range(query: dict, field: str, gte: Optional[datetime] = None, lt: Optional[datetime] = None) -> dict:
+    """Add a range condition on a date field; in compat mode it also matches legacy string values."""
+    condition = {}
+    if gte is not None:
+        condition['$gte'] = gte
+    if lt is not None:
+        condition['$lt'] = lt
+    if not condition:
+        return query
+    if not DATE_COMPAT_READS:
+        query[field] = condition
+        return query
+    # Mongo only compares values of the same BSON type, so the string form needs its own branch
+    legacy = {op: value.astimezone(timezone.utc).isoformat() for op, value in condition.items()}
+    query.setdefault("$and", []).append({"$or": [{field: condition}, {field: legacy}]})
+    return query
+
+# ============= PAGINATION =============
+
+# List endpoints return a JSON array; the cursor for the next page travels in this header
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 1000
+DATE_SORT_FIELDS = {"created_at", "updated_at", "expiration_date"}
+
+def encode_cursor(doc: dict, sort_field: str) -> str:
+    # json_util keeps the BSON type of the sort value, so the next query compares like with like
+    raw = json_util.dumps([doc.get(sort_field), doc['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[object, str]:
+    try:
+        value, last_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, last_id
+
+async def fetch_page(collection, query: dict, projection: dict, sort_field: str, order: str,
+                     limit: int, after: Optional[str], response: Response) -> List[dict]:
+    """Keyset pagination over (sort_field, id); sets the next-page cursor header when more rows exist."""
+    direction = ASCENDING if order == "asc" else DESCENDING
+    if after:
+        value, last_id = decode_cursor(after)
+        op = "$gt" if direction == ASCENDING else "$lt"
+        branches = [
+            {sort_field: {op: value}},
+            {sort_field: value, "id": {op: last_id}},
+        ]
+        if DATE_COMPAT_READS and sort_field in DATE_SORT_FIELDS:
+            # Comparisons never cross BSON types and strings sort before dates:
+            # keep walking into the other type once one is exhausted
+            if direction == ASCENDING and isinstance(value, str):
+                branches.append({sort_field: {"$type": "date"}})
+            elif direction == DESCENDING and isinstance(value, datetime):
+                branches.append({sort_field: {"$type": "string"}})
+        keyset = {"$or": branches}
+        query = {"$and": [query, keyset]} if query else keyset
+    
+    docs = await collection.find(query, projection).sort(
+        [(sort_field, direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], sort_field)
+    return docs
+
+# ============= FAST JSON =============
+
+class FastJSONResponse(JSONResponse):
+    """orjson rendering; UTC datetimes come out as ...Z exactly like Pydantic's."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+@functools.lru_cache(maxsize=None)
+def model_projection(model) -> dict:
+    """Fetch only the fields the response model returns (also keeps secrets like password_hash out)."""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+@functools.lru_cache(maxsize=None)
+def model_defaults(model) -> dict:
+    return {
+        name: field.default
+        for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    }
+
+def list_response(rows: List[dict], model, collection: str, response: Response):
+    """Rows fetched with model_projection(model): let FastAPI validate them through
+    response_model, or with FAST_JSON_RESPONSES serialize them directly.
+
+    The fast path trusts the stored data; it only fills field defaults and
+    converts legacy string dates, which is all validation would change.
+    """
+    if not FAST_JSON_RESPONSES:
+        return rows
+    
+    defaults = model_defaults(model)
+    fields = DATE_FIELDS[collection]
+    content = [coerce_dates({**defaults, **row}, fields) for row in rows]
+    # A returned Response bypasses the injected one, so carry the cursor over
+    headers = {}
+    if NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+    return FastJSONResponse(content, headers=headers)
+
 # ============= AUTH ROUTES =============
 
 @api_router.post("/auth/register")
@@ -176,10 +905,13 @@ async def register(user_data: UserCreate):
     
     user = User(email=user_data.email, role=user_data.role)
     user_doc = user.model_dump()
-    user_doc['password_hash'] = hash_password(user_data.password)
-    user_doc['created_at'] = user_doc['created_at'].isoformat()
+    user_doc['password_hash'] = await run_password_job(hash_password, user_data.password)
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    await bump_stats({"total_users": 1})
     
     token = create_access_token({"sub": user.id, "email": user.email, "role": user.role})
     return {"token": token, "user": user}
@@ -190,9 +922,15 @@ async def login(credentials: UserLogin):
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not verify_password(credentials.password, user_doc['password_hash']):
+    valid, new_hash = await run_password_job(
+        verify_and_update_password, credentials.password, user_doc['password_hash']
+    )
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    if new_hash:
+        await db.users.update_one({"id": user_doc['id']}, {"$set": {"password_hash": new_hash}})
+    
     user = User(**user_doc)
     token = create_access_token({"sub": user.id, "email": user.email, "role": user.role})
     return {"token": token, "user": user}
@@ -204,20 +942,24 @@ async def get_me(current_user: User = Depends(get_current_user)):
 # ============= PRODUCT ROUTES (ADMIN) =============
 
 @api_router.get("/products", response_model=List[Product])
-async def get_products(current_user: User = Depends(get_current_user)):
-    products = await db.products.find({}, {"_id": 0}).to_list(1000)
-    for p in products:
-        if isinstance(p.get('created_at'), str):
-            p['created_at'] = datetime.fromisoformat(p['created_at'])
-    return products
+async def get_products(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    sort: Literal["created_at", "name"] = "created_at",
+    order: Literal["asc", "desc"] = "asc",
+    current_user: User = Depends(get_current_user)
+):
+    rows = await fetch_page(db.products, {}, model_projection(Product), sort, order, limit, after, response)
+    return list_response(rows, Product, "products", response)
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product_data: ProductCreate, admin: User = Depends(get_admin_user)):
     product = Product(**product_data.model_dump())
     product_doc = product.model_dump()
-    product_doc['created_at'] = product_doc['created_at'].isoformat()
     
     await db.products.insert_one(product_doc)
+    await bump_stats({"total_products": 1})
     return product
 
 @api_router.put("/products/{product_id}", response_model=Product)
@@ -231,9 +973,15 @@ async def update_product(product_id: str, product_data: ProductCreate, admin: Us
         {"$set": product_data.model_dump()}
     )
     
+    if existing['name'] != product_data.name:
+        await db.licenses.update_many(
+            {"product_id": product_id},
+            {"$set": {"product_name": product_data.name, "updated_at": datetime.now(timezone.utc)}}
+        )
+        await revoke_product_tokens(product_id, "product_renamed")
+    invalidate_product_verdicts(product_id)
+    
     updated = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if isinstance(updated.get('created_at'), str):
-        updated['created_at'] = datetime.fromisoformat(updated['created_at'])
     return Product(**updated)
 
 @api_router.delete("/products/{product_id}")
@@ -241,21 +989,54 @@ async def delete_product(product_id: str, admin: User = Depends(get_admin_user))
     result = await db.products.delete_one({"id": product_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Product not found")
+    # Orphaned licenses must stop matching any product name
+    await db.licenses.update_many(
+        {"product_id": product_id},
+        {"$set": {"product_name": None, "updated_at": datetime.now(timezone.utc)}}
+    )
+    await revoke_product_tokens(product_id, "product_deleted")
+    invalidate_product_verdicts(product_id)
+    await bump_stats({"total_products": -1})
     return {"message": "Product deleted"}
 
 # ============= LICENSE ROUTES =============
 
+def license_filter_query(status: Optional[str] = None, product_id: Optional[str] = None,
+                         domain: Optional[str] = None, client_name: Optional[str] = None,
+                         expires_after: Optional[datetime] = None, expires_before: Optional[datetime] = None) -> dict:
+    query = {}
+    if status:
+        query['status'] = status
+    if product_id:
+        query['product_id'] = product_id
+    if domain:
+        query['domain'] = domain
+    if client_name:
+        # Anchored, case-sensitive regex so the client_name index can serve it
+        query['client_name'] = {"$regex": f"^{re.escape(client_name)}"}
+    return apply_date_range(query, 'expiration_date', expires_after, expires_before)
+
 @api_router.get("/licenses", response_model=List[License])
-async def get_licenses(current_user: User = Depends(get_current_user)):
-    query = {} if current_user.role == "admin" else {"user_id": current_user.id}
-    licenses = await db.licenses.find(query, {"_id": 0}).to_list(1000)
-    
-    for lic in licenses:
-        for field in ['created_at', 'updated_at', 'expiration_date']:
-            if isinstance(lic.get(field), str):
-                lic[field] = datetime.fromisoformat(lic[field])
+async def get_licenses(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    sort: Literal["created_at", "expiration_date", "client_name"] = "created_at",
+    order: Literal["asc", "desc"] = "asc",
+    status: Optional[str] = None,
+    product_id: Optional[str] = None,
+    domain: Optional[str] = None,
+    client_name: Optional[str] = Query(None, description="Prefix match"),
+    expires_after: Optional[datetime] = None,
+    expires_before: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    query = license_filter_query(status, product_id, domain, client_name, expires_after, expires_before)
+    if current_user.role != "admin":
+        query['user_id'] = current_user.id
     
-    return licenses
+    rows = await fetch_page(db.licenses, query, model_projection(License), sort, order, limit, after, response)
+    return list_response(rows, License, "licenses", response)
 
 @api_router.post("/licenses", response_model=License)
 async def create_license(license_data: LicenseCreate, admin: User = Depends(get_admin_user)):
@@ -269,13 +1050,12 @@ async def create_license(license_data: LicenseCreate, admin: User = Depends(get_
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    license_obj = License(**license_data.model_dump())
+    license_obj = License(**license_data.model_dump(), product_name=product['name'])
     license_doc = license_obj.model_dump()
-    license_doc['created_at'] = license_doc['created_at'].isoformat()
-    license_doc['updated_at'] = license_doc['updated_at'].isoformat()
-    license_doc['expiration_date'] = license_doc['expiration_date'].isoformat()
     
     await db.licenses.insert_one(license_doc)
+    license_key_filter.add(license_doc['license_key'])
+    await bump_stats(license_stats_delta(license_doc, 1))
     return license_obj
 
 @api_router.put("/licenses/{license_id}", response_model=License)
@@ -286,37 +1066,229 @@ async def update_license(license_id: str, license_data: LicenseUpdate, admin: Us
     
     update_data = {k: v for k, v in license_data.model_dump().items() if v is not None}
     if update_data:
-        if 'expiration_date' in update_data:
-            update_data['expiration_date'] = update_data['expiration_date'].isoformat()
-        update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+        if 'product_id' in update_data:
+            product = await db.products.find_one({"id": update_data['product_id']}, {"_id": 0, "name": 1})
+            if not product:
+                raise HTTPException(status_code=404, detail="Product not found")
+            update_data['product_name'] = product['name']
+        update_data['updated_at'] = datetime.now(timezone.utc)
         
         await db.licenses.update_one(
             {"id": license_id},
             {"$set": update_data}
         )
+        invalidate_license_verdicts(existing['license_key'])
+        if update_data.keys() & TOKEN_CLAIM_FIELDS:
+            await revoke_license_tokens([existing['license_key']], "license_updated")
+        if 'status' in update_data or 'product_id' in update_data:
+            delta = license_stats_delta(existing, -1)
+            delta.update(license_stats_delta({**existing, **update_data}, 1))
+            await bump_stats(delta)
     
     updated = await db.licenses.find_one({"id": license_id}, {"_id": 0})
-    for field in ['created_at', 'updated_at', 'expiration_date']:
-        if isinstance(updated.get(field), str):
-            updated[field] = datetime.fromisoformat(updated[field])
     return License(**updated)
 
 @api_router.delete("/licenses/{license_id}")
 async def delete_license(license_id: str, admin: User = Depends(get_admin_user)):
-    result = await db.licenses.delete_one({"id": license_id})
-    if result.deleted_count == 0:
+    deleted = await db.licenses.find_one_and_delete(
+        {"id": license_id},
+        {"_id": 0, "license_key": 1, "status": 1, "product_id": 1}
+    )
+    if deleted is None:
         raise HTTPException(status_code=404, detail="License not found")
+    invalidate_license_verdicts(deleted['license_key'])
+    await revoke_license_tokens([deleted['license_key']], "license_deleted")
+    await bump_stats(license_stats_delta(deleted, -1))
     return {"message": "License deleted"}
 
+# ============= BULK LICENSE OPERATIONS (ADMIN) =============
+
+async def bulk_create_licenses(rows: List[Dict[str, Any]]) -> dict:
+    """Validate every row, check all product/user ids with two $in queries and insert
+    the valid ones unordered; a bad row is reported without aborting the rest."""
+    if len(rows) > LICENSE_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Bulk import limited to {LICENSE_BULK_MAX_ITEMS} rows")
+    
+    errors = []
+    parsed = []
+    for row_number, row in enumerate(rows):
+        try:
+            parsed.append((row_number, LicenseCreate.model_validate(row)))
+        except ValidationError as e:
+            errors.append({"row": row_number, "error": "; ".join(
+                f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+            )})
+    
+    product_ids = list({data.product_id for _, data in parsed})
+    user_ids = list({data.user_id for _, data in parsed})
+    products = {
+        p['id']: p['name']
+        for p in await db.products.find({"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    }
+    users = {u['id'] for u in await db.users.find({"id": {"$in": user_ids}}, {"_id": 0, "id": 1}).to_list(None)}
+    
+    docs = []
+    doc_rows = []
+    for row_number, data in parsed:
+        if data.product_id not in products:
+            errors.append({"row": row_number, "error": "Product not found"})
+        elif data.user_id not in users:
+            errors.append({"row": row_number, "error": "User not found"})
+        else:
+            docs.append(License(**data.model_dump(), product_name=products[data.product_id]).model_dump())
+            doc_rows.append(row_number)
+    
+    failed = set()
+    if docs:
+        try:
+            # insert_many adds _id to each doc; copies keep the response clean
+            await db.licenses.insert_many([dict(doc) for doc in docs], ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                failed.add(write_error['index'])
+                errors.append({"row": doc_rows[write_error['index']], "error": write_error.get('errmsg', 'Insert failed')})
+    
+    created = [doc for index, doc in enumerate(docs) if index not in failed]
+    delta = Counter()
+    for doc in created:
+        license_key_filter.add(doc['license_key'])
+        delta.update(license_stats_delta(doc, 1))
+    await bump_stats(delta)
+    if created:
+        expiring_cache.clear()
+    
+    errors.sort(key=lambda err: err['row'])
+    return {
+        "created": len(created),
+        "failed": len(errors),
+        "errors": errors,
+        "licenses": [License(**doc) for doc in created],
+    }
+
+async def bulk_update_licenses(license_filter: LicenseBulkFilter, update, extra_query: dict,
+                               new_status, reason: str) -> dict:
+    """Apply one update_many per chunk of matching ids, then settle caches, tokens and stats.
+
+    Matches are streamed from the cursor LICENSE_BULK_UPDATE_CHUNK at a time and
+    each chunk is updated by id, so the side effects cover exactly the documents
+    updated. An update can move a document further along the index being
+    scanned and make the cursor return it again; the ids already handled are
+    skipped so it is never updated twice. new_status(old_status) gives each
+    license's status after the update.
+    """
+    filter_fields = license_filter.model_dump(exclude={"ids"}, exclude_none=True)
+    if not filter_fields and not license_filter.ids:
+        raise HTTPException(status_code=400, detail="At least one filter is required")
+    query = license_filter_query(**filter_fields)
+    if license_filter.ids:
+        query['id'] = {"$in": license_filter.ids}
+    query.update(extra_query)
+    
+    matched = 0
+    modified = 0
+    delta = Counter()
+    handled = set()
+    
+    async def apply(chunk):
+        nonlocal matched, modified
+        result = await db.licenses.update_many({"id": {"$in": [doc['id'] for doc in chunk]}}, update)
+        matched += result.matched_count
+        modified += result.modified_count
+        
+        keys = [doc['license_key'] for doc in chunk]
+        for key in keys:
+            invalidate_license_verdicts(key)
+        await revoke_license_tokens(keys, reason)
+        for doc in chunk:
+            status_after = new_status(doc['status'])
+            if status_after != doc['status']:
+                delta.update(license_stats_delta(doc, -1))
+                delta.update(license_stats_delta({**doc, "status": status_after}, 1))
+    
+    chunk = []
+    cursor = db.licenses.find(
+        query, {"_id": 0, "id": 1, "license_key": 1, "status": 1, "product_id": 1}
+    ).batch_size(LICENSE_BULK_UPDATE_CHUNK)
+    async for doc in cursor:
+        if doc['id'] in handled:
+            continue
+        handled.add(doc['id'])
+        chunk.append(doc)
+        if len(chunk) >= LICENSE_BULK_UPDATE_CHUNK:
+            await apply(chunk)
+            chunk = []
+    if chunk:
+        await apply(chunk)
+    
+    await bump_stats(delta)
+    expiring_cache.clear()
+    return {"matched": matched, "modified": modified}
+
+@api_router.post("/licenses/bulk")
+async def create_licenses_bulk(rows: List[Dict[str, Any]], admin: User = Depends(get_admin_user)):
+    return await bulk_create_licenses(rows)
+
+@api_router.post("/licenses/bulk/csv")
+async def create_licenses_bulk_csv(file: UploadFile = File(...), admin: User = Depends(get_admin_user)):
+    """CSV with a header row: client_name,domain,product_id,user_id,expiration_date[,status]."""
+    try:
+        text = (await file.read()).decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV must be UTF-8")
+    rows = [
+        {column.strip(): value.strip() for column, value in row.items() if column and value and value.strip()}
+        for row in csv.DictReader(io.StringIO(text))
+    ]
+    return await bulk_create_licenses(rows)
+
+@api_router.post("/licenses/bulk/renew")
+async def renew_licenses_bulk(renew: LicenseBulkRenew, admin: User = Depends(get_admin_user)):
+    """Extend matching licenses by extend_days, counted from today for ones already expired."""
+    expiration = "$expiration_date"
+    if DATE_COMPAT_READS:
+        expiration = {"$cond": [
+            {"$eq": [{"$type": "$expiration_date"}, "string"]},
+            {"$dateFromString": {"dateString": "$expiration_date"}},
+            "$expiration_date",
+        ]}
+    now = datetime.now(timezone.utc)
+    update = [{"$set": {
+        "expiration_date": {"$add": [{"$max": [expiration, now]}, renew.extend_days * 86400000]},
+        # Renewing brings expired licenses back; inactive ones stay inactive
+        "status": {"$cond": [{"$eq": ["$status", "expired"]}, "active", "$status"]},
+        "updated_at": now,
+    }}]
+    return await bulk_update_licenses(
+        renew.filter, update, {},
+        lambda status: "active" if status == "expired" else status,
+        "license_renewed",
+    )
+
+@api_router.post("/licenses/bulk/status")
+async def change_licenses_status_bulk(change: LicenseBulkStatus, admin: User = Depends(get_admin_user)):
+    if change.filter.status == change.status:
+        return {"matched": 0, "modified": 0}
+    update = {"$set": {"status": change.status, "updated_at": datetime.now(timezone.utc)}}
+    extra_query = {} if change.filter.status else {"status": {"$ne": change.status}}
+    return await bulk_update_licenses(
+        change.filter, update, extra_query,
+        lambda status: change.status,
+        "license_updated",
+    )
+
 # ============= USER MANAGEMENT (ADMIN) =============
 
 @api_router.get("/users", response_model=List[User])
-async def get_users(admin: User = Depends(get_admin_user)):
-    users = await db.users.find({}, {"_id": 0, "password_hash": 0}).to_list(1000)
-    for u in users:
-        if isinstance(u.get('created_at'), str):
-            u['created_at'] = datetime.fromisoformat(u['created_at'])
-    return users
+async def get_users(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    sort: Literal["created_at", "email"] = "created_at",
+    order: Literal["asc", "desc"] = "asc",
+    admin: User = Depends(get_admin_user)
+):
+    rows = await fetch_page(db.users, {}, model_projection(User), sort, order, limit, after, response)
+    return list_response(rows, User, "users", response)
 
 @api_router.delete("/users/{user_id}")
 async def delete_user(user_id: str, admin: User = Depends(get_admin_user)):
@@ -326,28 +1298,22 @@ async def delete_user(user_id: str, admin: User = Depends(get_admin_user)):
     result = await db.users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    principal_cache.pop(user_id)
+    await bump_stats({"total_users": -1})
     return {"message": "User deleted"}
 
 # ============= PUBLIC LICENSE VERIFICATION =============
 
-@api_router.post("/verify", response_model=LicenseVerifyResponse)
-async def verify_license(verify_req: LicenseVerifyRequest):
-    # Find license by key
-    license_doc = await db.licenses.find_one({"license_key": verify_req.license_key}, {"_id": 0})
-    
-    if not license_doc:
-        return LicenseVerifyResponse(
-            valid=False,
-            message="Invalid license key"
-        )
-    
-    # Parse dates
-    for field in ['created_at', 'updated_at', 'expiration_date']:
-        if isinstance(license_doc.get(field), str):
-            license_doc[field] = datetime.fromisoformat(license_doc[field])
-    
-    license_obj = License(**license_doc)
-    
+def parse_license_doc(license_doc: dict) -> License:
+    return License(**coerce_dates(license_doc, DATE_FIELDS['licenses']))
+
+def has_product_name(license_obj: License) -> bool:
+    # Licenses written before the denormalization carry no product_name at all;
+    # an explicit None means the product was deleted.
+    return "product_name" in license_obj.model_fields_set
+
+def evaluate_license(verify_req: LicenseVerifyRequest, license_obj: License, product_name: Optional[str], now: datetime) -> LicenseVerifyResponse:
+    """Apply the verification rules. Read-only: the expiration sweeper flips statuses."""
     # Check domain (exact match)
     if license_obj.domain != verify_req.domain:
         return LicenseVerifyResponse(
@@ -356,8 +1322,7 @@ async def verify_license(verify_req: LicenseVerifyRequest):
         )
     
     # Check product
-    product = await db.products.find_one({"id": license_obj.product_id}, {"_id": 0})
-    if not product or product['name'] != verify_req.product_name:
+    if product_name is None or product_name != verify_req.product_name:
         return LicenseVerifyResponse(
             valid=False,
             message="Product mismatch"
@@ -371,12 +1336,7 @@ async def verify_license(verify_req: LicenseVerifyRequest):
         )
     
     # Check expiration
-    if license_obj.expiration_date < datetime.now(timezone.utc):
-        # Auto-update to expired
-        await db.licenses.update_one(
-            {"id": license_obj.id},
-            {"$set": {"status": "expired"}}
-        )
+    if license_obj.expiration_date < now:
         return LicenseVerifyResponse(
             valid=False,
             message="License has expired"
@@ -392,141 +1352,1473 @@ async def verify_license(verify_req: LicenseVerifyRequest):
         }
     )
 
+async def check_license(verify_req: LicenseVerifyRequest) -> Tuple[LicenseVerifyResponse, Optional[License]]:
+    """Run the verification rules against Mongo; returns the verdict and the license it was based on."""
+    # Find license by key
+    license_doc = await db.licenses.find_one({"license_key": verify_req.license_key}, {"_id": 0})
+    
+    if not license_doc:
+        license_key_filter.record_false_positive()
+        return LicenseVerifyResponse(
+            valid=False,
+            message="Invalid license key"
+        ), None
+    
+    license_obj = parse_license_doc(license_doc)
+    
+    product_name = license_obj.product_name
+    if not has_product_name(license_obj) and license_obj.domain == verify_req.domain:
+        product = await db.products.find_one({"id": license_obj.product_id}, {"_id": 0, "name": 1})
+        product_name = product['name'] if product else None
+    
+    response = evaluate_license(verify_req, license_obj, product_name, datetime.now(timezone.utc))
+    return response, license_obj
+
+def cache_verdict(cache_key: tuple, response: LicenseVerifyResponse, license_obj: Optional[License], generation: int):
+    # Unknown keys are not cached: a flood of random keys would otherwise evict the warm entries
+    if license_obj is None:
+        return
+    ttl = None
+    if response.valid:
+        # A valid verdict must not outlive the license itself
+        ttl = (license_obj.expiration_date - datetime.now(timezone.utc)).total_seconds()
+    verify_cache.set(
+        cache_key,
+        response,
+        ttl=ttl,
+        tags=(f"license:{license_obj.license_key}", f"product:{license_obj.product_id}"),
+        generation=generation
+    )
+
+@api_router.post("/verify", response_model=LicenseVerifyResponse)
+async def verify_license(verify_req: LicenseVerifyRequest, background_tasks: BackgroundTasks):
+    response = await resolve_verdict(verify_req)
+    verification_events.record(verify_req, response)
+    if SERVERLESS:
+        background_tasks.add_task(verification_events.flush_if_due)
+    return response
+
+async def resolve_verdict(verify_req: LicenseVerifyRequest) -> LicenseVerifyResponse:
+    cache_key = (verify_req.license_key, verify_req.domain, verify_req.product_name)
+    cached = verify_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    if not license_key_filter.might_exist(verify_req.license_key):
+        return LicenseVerifyResponse(valid=False, message="Invalid license key")
+    
+    generation = verify_cache.generation
+    response, license_obj = await check_license(verify_req)
+    cache_verdict(cache_key, response, license_obj, generation)
+    return response
+
+@api_router.post("/verify/batch", response_model=List[LicenseVerifyResponse])
+async def verify_license_batch(verify_reqs: List[LicenseVerifyRequest], background_tasks: BackgroundTasks):
+    """Verify many licenses at once; results come back in request order."""
+    if len(verify_reqs) > VERIFY_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch limited to {VERIFY_BATCH_MAX_ITEMS} items")
+    
+    results: List[Optional[LicenseVerifyResponse]] = [None] * len(verify_reqs)
+    pending = []
+    for index, verify_req in enumerate(verify_reqs):
+        cache_key = (verify_req.license_key, verify_req.domain, verify_req.product_name)
+        cached = verify_cache.get(cache_key)
+        if cached is not None:
+            results[index] = cached
+        elif not license_key_filter.might_exist(verify_req.license_key):
+            results[index] = LicenseVerifyResponse(valid=False, message="Invalid license key")
+        else:
+            pending.append((index, cache_key))
+    
+    if not pending:
+        verification_events.record_many(verify_reqs, results)
+        if SERVERLESS:
+            background_tasks.add_task(verification_events.flush_if_due)
+        return results
+    
+    generation = verify_cache.generation
+    license_keys = list({verify_reqs[index].license_key for index, _ in pending})
+    license_docs = await db.licenses.find({"license_key": {"$in": license_keys}}, {"_id": 0}).to_list(None)
+    licenses = {doc['license_key']: parse_license_doc(doc) for doc in license_docs}
+    
+    product_names = {}
+    product_ids = list({lic.product_id for lic in licenses.values() if not has_product_name(lic)})
+    if product_ids:
+        product_docs = await db.products.find({"id": {"$in": product_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+        product_names = {p['id']: p['name'] for p in product_docs}
+    
+    now = datetime.now(timezone.utc)
+    for index, cache_key in pending:
+        verify_req = verify_reqs[index]
+        license_obj = licenses.get(verify_req.license_key)
+        if license_obj is None:
+            license_key_filter.record_false_positive()
+            response = LicenseVerifyResponse(valid=False, message="Invalid license key")
+        else:
+            product_name = license_obj.product_name if has_product_name(license_obj) else product_names.get(license_obj.product_id)
+            response = evaluate_license(verify_req, license_obj, product_name, now)
+        results[index] = response
+        cache_verdict(cache_key, response, license_obj, generation)
+    
+    verification_events.record_many(verify_reqs, results)
+    if SERVERLESS:
+        background_tasks.add_task(verification_events.flush_if_due)
+    return results
+
+@api_router.get("/verify/cache/stats")
+async def get_verify_cache_stats(admin: User = Depends(get_admin_user)):
+    return verify_cache.stats()
+
+@api_router.get("/verify/key-filter/stats")
+async def get_key_filter_stats(admin: User = Depends(get_admin_user)):
+    return license_key_filter.stats()
+
+# ============= VERIFICATION EVENTS =============
+
+class VerificationEventBuffer:
+    """Write-behind log of /verify calls.
+
+    record() never waits: events go to a bounded in-memory queue (dropped and
+    counted when full) and run_verification_event_flusher writes them in
+    batches. Each batch also updates hourly rollups in db.verification_hourly,
+    which back the analytics endpoints. Unknown keys are only counted in a
+    shared bucket (license_key null) so random-key floods don't fill the log.
+    """
+
+    def __init__(self, maxsize: int, enabled: bool):
+        self.enabled = enabled
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush = time.monotonic()
+
+    def record(self, verify_req: LicenseVerifyRequest, response: LicenseVerifyResponse):
+        if not self.enabled:
+            return
+        event = {
+            "license_key": verify_req.license_key,
+            "domain": verify_req.domain,
+            "product_name": verify_req.product_name,
+            "product_id": response.license_data.get("product_id") if response.license_data else None,
+            "valid": response.valid,
+            "message": response.message,
+            "at": datetime.now(timezone.utc),
+        }
+        try:
+            self.queue.put_nowait(event)
+            self.enqueued += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def record_many(self, verify_reqs: List[LicenseVerifyRequest], responses: List[LicenseVerifyResponse]):
+        for verify_req, response in zip(verify_reqs, responses):
+            self.record(verify_req, response)
+
+    async def next_batch(self) -> List[dict]:
+        """Wait for one event, then collect until VERIFY_EVENTS_BATCH or VERIFY_EVENTS_FLUSH_INTERVAL."""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + VERIFY_EVENTS_FLUSH_INTERVAL
+        try:
+            while len(batch) < VERIFY_EVENTS_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Shutting down: hand the collected events back to drain()
+            for event in batch:
+                self.queue.put_nowait(event)
+            raise
+        return batch
+
+    async def flush(self, batch: List[dict]):
+        raw = [event for event in batch if event["message"] != "Invalid license key"]
+        rollups = {}
+        for event in batch:
+            license_key = None if event["message"] == "Invalid license key" else event["license_key"]
+            hour = event["at"].replace(minute=0, second=0, microsecond=0)
+            bucket = rollups.setdefault((license_key, hour), {"total": 0, "valid": 0, "domains": set(), "product_id": None})
+            bucket["total"] += 1
+            bucket["valid"] += event["valid"]
+            if license_key is not None:
+                bucket["domains"].add(event["domain"])
+                bucket["product_id"] = event["product_id"] or bucket["product_id"]
+        
+        requests = []
+        for (license_key, hour), bucket in rollups.items():
+            update = {
+                "$inc": {"total": bucket["total"], "valid": bucket["valid"], "invalid": bucket["total"] - bucket["valid"]},
+                "$addToSet": {"domains": {"$each": sorted(bucket["domains"])}},
+            }
+            if bucket["product_id"]:
+                update["$set"] = {"product_id": bucket["product_id"]}
+            requests.append(UpdateOne({"license_key": license_key, "hour": hour}, update, upsert=True))
+        
+        self.last_flush = time.monotonic()
+        try:
+            if raw:
+                await db.verification_events.insert_many(raw, ordered=False)
+            await db.verification_hourly.bulk_write(requests, ordered=False)
+            self.written += len(batch)
+            self.flushes += 1
+        except PyMongoError as e:
+            self.failed += len(batch)
+            logger.error(f"Dropped {len(batch)} verification events: {str(e)}")
+
+    async def flush_if_due(self):
+        """Serverless stand-in for the flusher, run after a response is sent."""
+        if (self.queue.qsize() >= VERIFY_EVENTS_BATCH
+                or time.monotonic() - self.last_flush >= VERIFY_EVENTS_FLUSH_INTERVAL):
+            await self.drain()
+
+    async def drain(self):
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await self.flush(batch)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "buffered": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
+
+verification_events = VerificationEventBuffer(VERIFY_EVENTS_BUFFER, VERIFY_EVENTS_ENABLED)
+
+async def run_verification_event_flusher():
+    """Per-replica: each process flushes its own buffer."""
+    while True:
+        batch = await verification_events.next_batch()
+        await verification_events.flush(batch)
+
+def analytics_window(start: Optional[datetime], end: Optional[datetime]) -> dict:
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=30)
+    return {"hour": {"$gte": start, "$lt": end}}
+
+@api_router.get("/analytics/verifications")
+async def get_verification_analytics(
+    group_by: Literal["license", "product", "day"] = "day",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    license_key: Optional[str] = None,
+    product_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    admin: User = Depends(get_admin_user)
+):
+    """Verification counts from the hourly rollups (default: last 30 days)."""
+    match = analytics_window(start, end)
+    if license_key:
+        match["license_key"] = license_key
+    if product_id:
+        match["product_id"] = product_id
+    
+    group_key = {
+        "license": "$license_key",
+        "product": "$product_id",
+        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$hour"}},
+    }[group_by]
+    sort = {"_id": 1} if group_by == "day" else {"total": -1}
+    pipeline = [
+        {"$match": match},
+        {"$group": {"_id": group_key, "total": {"$sum": "$total"}, "valid": {"$sum": "$valid"}, "invalid": {"$sum": "$invalid"}}},
+        {"$sort": sort},
+        {"$limit": limit},
+    ]
+    rows = await db.verification_hourly.aggregate(pipeline).to_list(None)
+    return [{group_by: row.pop("_id"), **row} for row in rows]
+
+@api_router.get("/analytics/domains")
+async def get_domain_analytics(
+    license_key: Optional[str] = None,
+    min_domains: int = Query(1, ge=1),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    admin: User = Depends(get_admin_user)
+):
+    """Distinct domains per license key, most domains first; min_domains=2 lists likely shared keys."""
+    match = analytics_window(start, end)
+    match["license_key"] = license_key if license_key else {"$ne": None}
+    pipeline = [
+        {"$match": match},
+        {"$unwind": "$domains"},
+        {"$group": {
+            "_id": "$license_key",
+            "domains": {"$addToSet": "$domains"},
+            "first_seen": {"$min": "$hour"},
+            "last_seen": {"$max": "$hour"},
+        }},
+        {"$project": {"domains": 1, "first_seen": 1, "last_seen": 1, "distinct_domains": {"$size": "$domains"}}},
+        {"$match": {"distinct_domains": {"$gte": min_domains}}},
+        {"$sort": {"distinct_domains": -1}},
+        {"$limit": limit},
+    ]
+    rows = await db.verification_hourly.aggregate(pipeline).to_list(None)
+    return [{"license_key": row.pop("_id"), **row} for row in rows]
+
+@api_router.get("/analytics/events/stats")
+async def get_verification_event_stats(admin: User = Depends(get_admin_user)):
+    return verification_events.stats()
+
+# ============= OFFLINE LICENSE TOKENS =============
+
+# Clients holding a token verify it locally with the public key and only call
+# back to refresh it or to pull revocations. A token for license_key is revoked
+# when a revocation entry has revoked_at >= the token's iat. Revocations are
+# public, so they carry sha256(license_key) rather than the key itself.
+
+# License fields whose change can turn a previously issued token into a lie
+TOKEN_CLAIM_FIELDS = {"domain", "product_id", "status", "expiration_date"}
+
+_signing_key = None
+
+def get_signing_key():
+    global _signing_key
+    if not LICENSE_SIGNING_KEY:
+        raise HTTPException(status_code=503, detail="Offline license tokens are not configured (LICENSE_SIGNING_KEY)")
+    if _signing_key is None:
+        from cryptography.hazmat.primitives import serialization
+        _signing_key = serialization.load_pem_private_key(
+            LICENSE_SIGNING_KEY.replace('\\n', '\n').encode(), password=None
+        )
+    return _signing_key
+
+def public_key_raw() -> bytes:
+    from cryptography.hazmat.primitives import serialization
+    return get_signing_key().public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+
+def signing_key_id() -> str:
+    return hashlib.sha256(public_key_raw()).hexdigest()[:16]
+
+def license_key_hash(license_key: str) -> str:
+    return hashlib.sha256(license_key.encode()).hexdigest()
+
+def issue_license_token(verify_req: LicenseVerifyRequest, license_data: dict, now: datetime) -> Tuple[str, datetime]:
+    license_expiration = datetime.fromisoformat(license_data['expiration_date'])
+    expires_at = min(now + timedelta(seconds=LICENSE_TOKEN_TTL), license_expiration)
+    claims = {
+        "iss": LICENSE_TOKEN_ISSUER,
+        "sub": verify_req.license_key,
+        "domain": verify_req.domain,
+        "product": verify_req.product_name,
+        "status": "active",
+        "license_exp": int(license_expiration.timestamp()),
+        "iat": int(now.timestamp()),
+        "exp": int(expires_at.timestamp()),
+    }
+    token = jwt.encode(claims, get_signing_key(), algorithm="EdDSA", headers={"kid": signing_key_id()})
+    return token, expires_at
+
+async def revoke_license_tokens(license_keys: List[str], reason: str):
+    if not license_keys:
+        return
+    now = datetime.now(timezone.utc)
+    expire_at = now + timedelta(seconds=LICENSE_TOKEN_TTL)
+    await db.revocations.insert_many(
+        [
+            {"key_hash": license_key_hash(key), "reason": reason, "revoked_at": now, "expire_at": expire_at}
+            for key in license_keys
+        ],
+        ordered=False
+    )
+
+async def revoke_product_tokens(product_id: str, reason: str, batch_size: int = 1000):
+    keys = []
+    async for doc in db.licenses.find({"product_id": product_id}, {"_id": 0, "license_key": 1}):
+        keys.append(doc['license_key'])
+        if len(keys) >= batch_size:
+            await revoke_license_tokens(keys, reason)
+            keys = []
+    await revoke_license_tokens(keys, reason)
+
+@api_router.post("/verify/token", response_model=LicenseTokenResponse)
+async def get_license_token(verify_req: LicenseVerifyRequest, background_tasks: BackgroundTasks):
+    """Verify a license and, when valid, issue (or refresh) a signed token for offline checks.
+
+    Always reads the license from Mongo: a cached verdict can predate a
+    revocation written on another replica, and the token would outlive it.
+    iat is taken before the read, so a revocation racing the read still wins.
+    """
+    # Refuse before touching Mongo when tokens can't be signed
+    get_signing_key()
+    issued_at = datetime.now(timezone.utc)
+    verdict, _ = await check_license(verify_req)
+    verification_events.record(verify_req, verdict)
+    if SERVERLESS:
+        background_tasks.add_task(verification_events.flush_if_due)
+    if not verdict.valid:
+        return LicenseTokenResponse(valid=False, message=verdict.message)
+    
+    token, expires_at = issue_license_token(verify_req, verdict.license_data, issued_at)
+    return LicenseTokenResponse(valid=True, message=verdict.message, token=token, expires_at=expires_at)
+
+@api_router.get("/verify/public-key")
+async def get_license_public_key():
+    from cryptography.hazmat.primitives import serialization
+    raw = public_key_raw()
+    pem = get_signing_key().public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return {
+        "algorithm": "EdDSA",
+        "key_id": signing_key_id(),
+        "public_key": base64.b64encode(raw).decode(),
+        "public_key_pem": pem.decode()
+    }
+
+@api_router.get("/verify/revocations")
+async def get_revocations(
+    after: Optional[str] = Query(None, description="Cursor from the previous page's next_cursor"),
+    since: Optional[datetime] = Query(None, description="First call only: revocations after this instant"),
+    key_hash: Optional[str] = Query(None, description="Only revocations of this license (sha256 hex of the key)"),
+    limit: int = Query(1000, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Revocations in (revoked_at, _id) order.
+
+    Every row of a revoke_license_tokens batch shares its revoked_at, so paging
+    on the timestamp alone would drop the rest of a batch cut by the page limit.
+    """
+    query = {}
+    if after:
+        revoked_at, last_id = decode_cursor(after)
+        query["$or"] = [
+            {"revoked_at": {"$gt": revoked_at}},
+            {"revoked_at": revoked_at, "_id": {"$gt": last_id}},
+        ]
+    elif since:
+        query["revoked_at"] = {"$gt": since}
+    if key_hash:
+        query["key_hash"] = key_hash.lower()
+    docs = await db.revocations.find(
+        query, {"_id": 1, "key_hash": 1, "revoked_at": 1, "reason": 1}
+    ).sort([("revoked_at", ASCENDING), ("_id", ASCENDING)]).limit(limit + 1).to_list(limit + 1)
+    
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if docs:
+        next_cursor = encode_cursor({"revoked_at": docs[-1]['revoked_at'], "id": docs[-1]['_id']}, "revoked_at")
+    else:
+        next_cursor = after
+    return {
+        "revocations": [
+            {
+                "key_hash": doc.get('key_hash'),
+                "revoked_at": doc['revoked_at'].isoformat(),
+                # Epoch seconds, rounded up: reject tokens whose iat <= this value
+                "revoked_at_ts": math.ceil(doc['revoked_at'].timestamp()),
+                "reason": doc['reason']
+            }
+            for doc in docs
+        ],
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    }
+
 # ============= DASHBOARD STATS (ADMIN) =============
 
+# A single document holds every counter; handlers keep it current with $inc so the
+# dashboard never has to scan licenses. rebuild_dashboard_stats() recomputes it
+# from scratch (startup when missing, or on demand if counters ever drift).
+# Only a rebuild creates the document: increments made while it is missing are
+# dropped, since the rebuild counts them anyway. Documents without rebuilt_at
+# were left partial by older releases and are rebuilt like missing ones.
+STATS_ID = "dashboard"
+
+# Short cache for the time-dependent "expiring in the next N days" counts
+expiring_cache = TTLCache(64, STATS_CACHE_TTL)
+
+def license_stats_delta(license_doc: dict, sign: int) -> Counter:
+    return Counter({
+        "total_licenses": sign,
+        f"licenses_by_status.{license_doc['status']}": sign,
+        f"licenses_by_product.{license_doc['product_id']}": sign,
+    })
+
+async def bump_stats(delta: dict):
+    inc = {k: v for k, v in delta.items() if v}
+    if inc:
+        await db.stats.update_one({"id": STATS_ID}, {"$inc": inc})
+
+async def bump_expired_stats(count: int):
+    if count:
+        await bump_stats({"licenses_by_status.active": -count, "licenses_by_status.expired": count})
+
+async def rebuild_dashboard_stats() -> dict:
+    facets = await db.licenses.aggregate([
+        {"$facet": {
+            "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+            "by_product": [{"$group": {"_id": "$product_id", "count": {"$sum": 1}}}],
+        }}
+    ]).to_list(1)
+    facet = facets[0] if facets else {"by_status": [], "by_product": []}
+    by_status = {row['_id']: row['count'] for row in facet['by_status']}
+    stats_doc = {
+        "id": STATS_ID,
+        "total_licenses": sum(by_status.values()),
+        "licenses_by_status": by_status,
+        "licenses_by_product": {row['_id']: row['count'] for row in facet['by_product']},
+        "total_products": await db.products.count_documents({}),
+        "total_users": await db.users.count_documents({}),
+        "rebuilt_at": datetime.now(timezone.utc),
+    }
+    await db.stats.replace_one({"id": STATS_ID}, stats_doc, upsert=True)
+    return stats_doc
+
+async def ensure_dashboard_stats():
+    stats_doc = await db.stats.find_one({"id": STATS_ID}, {"_id": 0, "rebuilt_at": 1})
+    if stats_doc is None or "rebuilt_at" not in stats_doc:
+        await rebuild_dashboard_stats()
+
+async def count_expiring(days: int) -> int:
+    count = expiring_cache.get(days)
+    if count is None:
+        now = datetime.now(timezone.utc)
+        query = apply_date_range({"status": "active"}, 'expiration_date', now, now + timedelta(days=days))
+        count = await db.licenses.count_documents(query)
+        expiring_cache.set(days, count)
+    return count
+
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats(admin: User = Depends(get_admin_user)):
-    total_licenses = await db.licenses.count_documents({})
-    active_licenses = await db.licenses.count_documents({"status": "active"})
-    total_products = await db.products.count_documents({})
-    total_users = await db.users.count_documents({})
+async def get_dashboard_stats(
+    days: int = Query(30, ge=1, le=365, description="Window for expiring_soon"),
+    admin: User = Depends(get_admin_user)
+):
+    stats_doc = await db.stats.find_one({"id": STATS_ID}, {"_id": 0})
+    if stats_doc is None or "rebuilt_at" not in stats_doc:
+        stats_doc = await rebuild_dashboard_stats()
+    by_status = stats_doc.get('licenses_by_status', {})
     
     return {
-        "total_licenses": total_licenses,
-        "active_licenses": active_licenses,
-        "total_products": total_products,
-        "total_users": total_users
+        "total_licenses": stats_doc.get('total_licenses', 0),
+        "active_licenses": by_status.get('active', 0),
+        "total_products": stats_doc.get('total_products', 0),
+        "total_users": stats_doc.get('total_users', 0),
+        "licenses_by_status": by_status,
+        "licenses_by_product": stats_doc.get('licenses_by_product', {}),
+        "expiring_soon": {"days": days, "count": await count_expiring(days)}
     }
 
+@api_router.post("/dashboard/stats/rebuild")
+async def rebuild_stats(admin: User = Depends(get_admin_user)):
+    expiring_cache.clear()
+    stats_doc = await rebuild_dashboard_stats()
+    return {"message": "Stats rebuilt", "total_licenses": stats_doc['total_licenses']}
+
+# ============= BACKGROUND JOBS =============
+
+background_tasks: List[asyncio.Task] = []
+
+# Runs of the leader jobs on this replica, for /api/metrics
+background_job_runs = Counter()
+background_job_documents = Counter()
+background_job_last_duration: Dict[str, float] = {}
+
+def start_background_task(coro):
+    background_tasks.append(asyncio.create_task(coro))
+
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+
+async def acquire_leader_lock(name: str, ttl: float) -> bool:
+    """Take or renew a lease in db.locks; only the holder runs the job until the lease lapses."""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.locks.find_one_and_update(
+            {"id": name, "$or": [{"owner": INSTANCE_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": INSTANCE_ID, "expires_at": now + timedelta(seconds=ttl)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return True
+    except DuplicateKeyError:
+        # Someone else holds an unexpired lease, so the upsert collided with their document
+        return False
+
+async def release_leader_lock(name: str):
+    await db.locks.update_one(
+        {"id": name, "owner": INSTANCE_ID},
+        {"$set": {"expires_at": datetime.now(timezone.utc)}}
+    )
+
+async def sweep_expired_licenses() -> int:
+    """Flip every active license past its expiration date to expired in one update_many."""
+    now = datetime.now(timezone.utc)
+    query = apply_date_range({"status": "active"}, 'expiration_date', lt=now)
+    result = await db.licenses.update_many(query, {"$set": {"status": "expired", "updated_at": now}})
+    if result.modified_count:
+        await bump_expired_stats(result.modified_count)
+        expiring_cache.clear()
+    return result.modified_count
+
+async def run_leader_job_once(name: str, lock_ttl: float, job) -> Optional[int]:
+    """Run job if this replica holds (or wins) the lock; records the run on the lock. None when not leader."""
+    if not await acquire_leader_lock(name, lock_ttl):
+        return None
+    started = time.perf_counter()
+    count = await job()
+    duration_ms = (time.perf_counter() - started) * 1000
+    background_job_runs[name] += 1
+    background_job_documents[name] += count
+    background_job_last_duration[name] = duration_ms / 1000
+    await db.locks.update_one(
+        {"id": name},
+        {"$set": {"last_run": {
+            "at": datetime.now(timezone.utc),
+            "duration_ms": round(duration_ms, 2),
+            "count": count
+        }}}
+    )
+    logger.info(f"{name}: {count} documents in {duration_ms:.1f} ms")
+    return count
+
+async def run_leader_job(name: str, interval: float, job):
+    """Run job every interval seconds on whichever replica holds the lock."""
+    while True:
+        try:
+            await run_leader_job_once(name, interval * 3, job)
+        except asyncio.CancelledError:
+            await release_leader_lock(name)
+            raise
+        except Exception as e:
+            logger.error(f"{name} failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+async def maintain_license_key_filter():
+    """Per-replica: initial build, then cheap refreshes with a periodic full rebuild."""
+    last_rebuild = None
+    while True:
+        try:
+            if (last_rebuild is None or license_key_filter.needs_rebuild
+                    or time.monotonic() - last_rebuild >= BLOOM_REBUILD_INTERVAL):
+                await license_key_filter.rebuild()
+                last_rebuild = time.monotonic()
+            else:
+                await license_key_filter.refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"License key filter maintenance failed: {str(e)}")
+        await asyncio.sleep(BLOOM_REFRESH_INTERVAL)
+
+@api_router.get("/maintenance/cron")
+async def run_maintenance_cron(authorization: Optional[str] = Header(None)):
+    """Vercel Cron entry point: one pass of the startup work and background jobs serverless mode skips."""
+    if not CRON_SECRET or not hmac.compare_digest(authorization or "", f"Bearer {CRON_SECRET}"):
+        raise HTTPException(status_code=401, detail="Invalid cron secret")
+    
+    await ensure_indexes()
+    await backfill_product_names()
+    await backfill_revocation_hashes()
+    await ensure_dashboard_stats()
+    expired = await run_leader_job_once("expiration_sweeper", EXPIRATION_SWEEP_INTERVAL * 3, sweep_expired_licenses)
+    payments = await drain_payment_events(limit=100)
+    await verification_events.drain()
+    return {"expired": expired, "payment_events": payments}
+
+@api_router.get("/health")
+async def health_check(check_db: bool = Query(False, alias="db")):
+    """Liveness; with ?db=true also pings MongoDB."""
+    health = {
+        "status": "ok",
+        "serverless": SERVERLESS,
+        "uptime_seconds": round(time.monotonic() - STARTED_AT, 3),
+    }
+    if check_db:
+        try:
+            await client.admin.command("ping")
+        except PyMongoError as e:
+            logger.error(f"Health check ping failed: {str(e)}")
+            raise HTTPException(status_code=503, detail="Database unavailable")
+    return health
+
+@api_router.get("/maintenance/jobs")
+async def get_background_jobs(admin: User = Depends(get_admin_user)):
+    """Leader and last run (duration, count) of each background job, across replicas."""
+    return await db.locks.find({}, {"_id": 0}).to_list(100)
+
 # ============= SETTINGS ROUTES (ADMIN) =============
 
+class SettingsCache:
+    """Process-wide copy of the settings document, reloaded only when its version changes.
+
+    update_settings bumps `version`; other replicas notice through watch_settings
+    (change stream, or a cheap version-only read every SETTINGS_VERSION_CHECK_INTERVAL).
+    """
+
+    def __init__(self):
+        self.settings = Settings()
+        self.version: Optional[int] = None
+        self.checked_at = float('-inf')
+        self.watching = False
+        self.reloads = 0
+
+    def apply(self, settings_doc: Optional[dict]):
+        self.settings = Settings(**settings_doc) if settings_doc else Settings()
+        self.version = self.settings.version
+        self.checked_at = time.monotonic()
+        self.reloads += 1
+
+    async def load(self):
+        self.apply(await db.settings.find_one({"id": "settings"}, {"_id": 0}))
+
+    async def check(self):
+        doc = await db.settings.find_one({"id": "settings"}, {"_id": 0, "version": 1})
+        if (doc or {}).get("version", 0) != self.version:
+            await self.load()
+        else:
+            self.checked_at = time.monotonic()
+
+    @property
+    def fresh(self) -> bool:
+        return self.watching or time.monotonic() - self.checked_at < SETTINGS_VERSION_CHECK_INTERVAL
+
+settings_cache = SettingsCache()
+
+async def current_settings() -> Settings:
+    # Only hits Mongo when no watcher has checked the version recently (e.g. right after a cold start)
+    if not settings_cache.fresh:
+        await settings_cache.check()
+    return settings_cache.settings
+
+async def watch_settings():
+    """Per-replica: follow settings changes through a change stream, polling the version where unsupported."""
+    if SETTINGS_CHANGE_STREAM:
+        try:
+            async with db.settings.watch() as stream:
+                settings_cache.watching = True
+                # Catch changes made between the initial load and the stream opening
+                await settings_cache.check()
+                async for _ in stream:
+                    await settings_cache.load()
+        except PyMongoError as e:
+            logger.info(f"Settings change stream unavailable, polling the version instead: {str(e)}")
+        finally:
+            settings_cache.watching = False
+    
+    while True:
+        try:
+            await settings_cache.check()
+        except PyMongoError as e:
+            logger.error(f"Settings version check failed: {str(e)}")
+        await asyncio.sleep(SETTINGS_VERSION_CHECK_INTERVAL)
+
 @api_router.get("/settings", response_model=Settings)
 async def get_settings(admin: User = Depends(get_admin_user)):
-    settings_doc = await db.settings.find_one({"id": "settings"}, {"_id": 0})
-    if not settings_doc:
-        default_settings = Settings()
-        settings_dict = default_settings.model_dump()
-        settings_dict['updated_at'] = settings_dict['updated_at'].isoformat()
-        await db.settings.insert_one(settings_dict)
-        return default_settings
-    
-    if isinstance(settings_doc.get('updated_at'), str):
-        settings_doc['updated_at'] = datetime.fromisoformat(settings_doc['updated_at'])
-    return Settings(**settings_doc)
+    return await current_settings()
 
 @api_router.put("/settings", response_model=Settings)
 async def update_settings(settings_data: SettingsUpdate, admin: User = Depends(get_admin_user)):
     update_dict = {k: v for k, v in settings_data.model_dump().items() if v is not None}
-    if update_dict:
-        update_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
-        
-        await db.settings.update_one(
-            {"id": "settings"},
-            {"$set": update_dict},
-            upsert=True
-        )
+    if not update_dict:
+        return await current_settings()
     
-    updated = await db.settings.find_one({"id": "settings"}, {"_id": 0})
-    if isinstance(updated.get('updated_at'), str):
-        updated['updated_at'] = datetime.fromisoformat(updated['updated_at'])
-    return Settings(**updated)
+    update_dict['updated_at'] = datetime.now(timezone.utc)
+    updated = await db.settings.find_one_and_update(
+        {"id": "settings"},
+        {"$set": update_dict, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    settings_cache.apply(updated)
+    return settings_cache.settings
 
 # ============= MERCADO PAGO PAYMENT ROUTES =============
 
+class PaymentGatewayError(Exception):
+    pass
+
+payment_http: Optional["httpx.AsyncClient"] = None
+# Set by the webhook so idle workers pick new events up without waiting for the next poll
+payment_events_ready = asyncio.Event()
+
+def get_payment_http() -> "httpx.AsyncClient":
+    """Shared pooled client; created lazily so it binds to the running event loop."""
+    global payment_http
+    if payment_http is None:
+        import httpx
+        payment_http = httpx.AsyncClient(
+            base_url=MERCADOPAGO_API_URL,
+            timeout=httpx.Timeout(MERCADOPAGO_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=MERCADOPAGO_MAX_CONNECTIONS,
+                max_keepalive_connections=MERCADOPAGO_MAX_CONNECTIONS,
+            ),
+        )
+    return payment_http
+
+async def close_payment_http():
+    global payment_http
+    if payment_http is not None:
+        await payment_http.aclose()
+        payment_http = None
+
+async def mercadopago_request(method: str, path: str, access_token: str, **kwargs) -> dict:
+    import httpx
+    headers = {"Authorization": f"Bearer {access_token}", **kwargs.pop("headers", {})}
+    try:
+        response = await get_payment_http().request(method, path, headers=headers, **kwargs)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        raise PaymentGatewayError(f"Mercado Pago {method} {path} returned {e.response.status_code}") from e
+    except httpx.HTTPError as e:
+        raise PaymentGatewayError(f"Mercado Pago {method} {path} failed: {e!r}") from e
+
+PAYMENT_BACK_URLS = {
+    outcome: f"{FRONTEND_URL}/payment/{outcome}"
+    for outcome in ("success", "failure", "pending")
+}
+
+async def get_payment_settings() -> Settings:
+    settings = await current_settings()
+    if not settings.enable_payments:
+        raise HTTPException(status_code=400, detail="Payments are not enabled")
+    if not settings.mercadopago_access_token:
+        raise HTTPException(status_code=400, detail="Mercado Pago not configured")
+    return settings
+
 @api_router.post("/create-payment-preference")
 async def create_payment_preference(
     payment_data: PaymentPreference,
     current_user: User = Depends(get_current_user)
 ):
-    try:
-        # Get settings to check if payments are enabled and get API keys
-        settings_doc = await db.settings.find_one({"id": "settings"})
-        if not settings_doc or not settings_doc.get('enable_payments'):
-            raise HTTPException(status_code=400, detail="Payments are not enabled")
-        
-        if not settings_doc.get('mercadopago_access_token'):
-            raise HTTPException(status_code=400, detail="Mercado Pago not configured")
-        
-        import mercadopago
-        sdk = mercadopago.SDK(settings_doc['mercadopago_access_token'])
-        
-        # Get product details
-        product = await db.products.find_one({"id": payment_data.product_id}, {"_id": 0})
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        # Create preference
-        preference_data = {
-            "items": [
-                {
-                    "title": payment_data.title,
-                    "description": payment_data.description,
-                    "quantity": 1,
-                    "currency_id": "BRL",
-                    "unit_price": payment_data.amount
-                }
-            ],
-            "back_urls": {
-                "success": f"{os.environ.get('FRONTEND_URL', 'http://localhost:3000')}/payment/success",
-                "failure": f"{os.environ.get('FRONTEND_URL', 'http://localhost:3000')}/payment/failure",
-                "pending": f"{os.environ.get('FRONTEND_URL', 'http://localhost:3000')}/payment/pending"
-            },
-            "auto_return": "approved",
-            "external_reference": f"{payment_data.license_id}_{payment_data.product_id}",
-            "metadata": {
-                "license_id": payment_data.license_id,
-                "product_id": payment_data.product_id,
-                "user_id": current_user.id
+    # Get settings to check if payments are enabled and get API keys
+    settings = await get_payment_settings()
+    
+    # Get product details
+    product = await db.products.find_one({"id": payment_data.product_id}, {"_id": 0})
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if not product.get('price'):
+        raise HTTPException(status_code=400, detail="Product has no price")
+    
+    license_query = {"id": payment_data.license_id, "product_id": payment_data.product_id}
+    if current_user.role != "admin":
+        license_query["user_id"] = current_user.id
+    if not await db.licenses.find_one(license_query, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="License not found")
+    
+    # Create preference
+    preference_data = {
+        "items": [
+            {
+                "title": payment_data.title,
+                "description": payment_data.description,
+                "quantity": 1,
+                "currency_id": PAYMENT_CURRENCY,
+                "unit_price": product['price']
             }
+        ],
+        "back_urls": PAYMENT_BACK_URLS,
+        "auto_return": "approved",
+        "external_reference": f"{payment_data.license_id}_{payment_data.product_id}",
+        "metadata": {
+            "license_id": payment_data.license_id,
+            "product_id": payment_data.product_id,
+            "user_id": current_user.id
         }
-        
-        result = sdk.preference().create(preference_data)
-        response = result["response"]
-        
-        return {
-            "preference_id": response["id"],
-            "init_point": response["init_point"],
-            "sandbox_init_point": response.get("sandbox_init_point")
-        }
-        
-    except Exception as e:
+    }
+    
+    try:
+        response = await mercadopago_request(
+            "POST", "/checkout/preferences", settings.mercadopago_access_token,
+            json=preference_data, headers={"X-Idempotency-Key": str(uuid.uuid4())},
+        )
+    except PaymentGatewayError as e:
         logger.error(f"Error creating payment preference: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=502, detail="Payment provider unavailable")
+    
+    return {
+        "preference_id": response["id"],
+        "init_point": response["init_point"],
+        "sandbox_init_point": response.get("sandbox_init_point")
+    }
+
+def valid_payment_id(payment_id: str) -> bool:
+    # Mercado Pago ids are numeric; anything else ("../", "?") would be spliced
+    # into an authenticated request path
+    return 0 < len(payment_id) <= 64 and payment_id.isascii() and payment_id.isdigit()
 
 @api_router.post("/webhook/mercadopago")
-async def mercadopago_webhook(request: dict):
-    """Webhook para receber notificações de pagamento do Mercado Pago"""
+async def mercadopago_webhook(request: dict, background_tasks: BackgroundTasks):
+    """Webhook para receber notificações de pagamento do Mercado Pago.
+
+    A notificação só é enfileirada em db.payment_events (uma por pagamento);
+    os workers consultam o status na API e aplicam o pagamento à licença.
+    """
+    if request.get("type") != "payment":
+        return {"status": "ignored"}
+    
+    payment_id = str(request.get("data", {}).get("id") or "")
+    if not valid_payment_id(payment_id):
+        return {"status": "ignored"}
+    
+    now = datetime.now(timezone.utc)
     try:
-        logger.info(f"Mercado Pago webhook received: {request}")
-        
-        # Processar notificação de pagamento
-        if request.get("type") == "payment":
-            payment_id = request.get("data", {}).get("id")
-            
-            if payment_id:
-                # Aqui você processaria o pagamento
-                # Por enquanto apenas log
-                logger.info(f"Payment notification received for: {payment_id}")
-        
-        return {"status": "ok"}
-        
-    except Exception as e:
-        logger.error(f"Webhook error: {str(e)}")
-        return {"status": "error"}
+        await db.payment_events.update_one(
+            {"payment_id": payment_id},
+            {
+                "$setOnInsert": {
+                    "id": str(uuid.uuid4()),
+                    "payment_id": payment_id,
+                    "status": "pending",
+                    "attempts": 0,
+                    "available_at": now,
+                    "created_at": now,
+                },
+                "$set": {"notified_at": now},
+            },
+            upsert=True,
+        )
+        # A payment that was still pending (or failed) when last checked is checked again
+        await db.payment_events.update_one(
+            {"payment_id": payment_id, "status": {"$in": ["ignored", "failed"]}},
+            {"$set": {"status": "pending", "attempts": 0, "available_at": now}},
+        )
+    except DuplicateKeyError:
+        # Concurrent delivery of the same notification; the other request queued it
+        pass
+    payment_events_ready.set()
+    if SERVERLESS:
+        # No workers here; handle it once the response is sent
+        background_tasks.add_task(drain_payment_events)
+    
+    logger.info(f"Payment notification queued for: {payment_id}")
+    return {"status": "ok"}
+
+async def lease_payment_event() -> Optional[dict]:
+    """Claim the next due event; an expired lease (crashed worker) makes it due again."""
+    now = datetime.now(timezone.utc)
+    return await db.payment_events.find_one_and_update(
+        {"status": {"$in": ["pending", "processing"]}, "available_at": {"$lte": now}},
+        {
+            "$set": {
+                "status": "processing",
+                "leased_by": INSTANCE_ID,
+                "available_at": now + timedelta(seconds=PAYMENT_EVENT_LEASE),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("available_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+async def finish_payment_event(event: dict, status: str, **fields):
+    # Matching on attempts drops the write if the lease expired and the event was re-leased
+    await db.payment_events.update_one(
+        {"id": event['id'], "attempts": event['attempts']},
+        {"$set": {"status": status, "processed_at": datetime.now(timezone.utc), **fields}},
+    )
+
+async def apply_payment_to_license(license_id: str, payment_id: str) -> bool:
+    """Activate the license and extend it by PAYMENT_LICENSE_EXTENSION_DAYS, once per payment.
+
+    Returns False when the payment was already applied. The write is guarded on
+    the expiration read here, so a concurrent edit makes it raise and retry.
+    """
+    license_doc = await db.licenses.find_one({"id": license_id}, {"_id": 0})
+    if not license_doc:
+        raise LookupError(f"License {license_id} not found")
+    if payment_id in license_doc.get('applied_payments', []):
+        return False
+    
+    now = datetime.now(timezone.utc)
+    current = coerce_dates(dict(license_doc), DATE_FIELDS['licenses'])['expiration_date']
+    expiration_date = max(current, now) + timedelta(days=PAYMENT_LICENSE_EXTENSION_DAYS)
+    
+    result = await db.licenses.update_one(
+        {
+            "id": license_id,
+            "expiration_date": license_doc['expiration_date'],
+            "applied_payments": {"$ne": payment_id},
+        },
+        {
+            "$set": {"status": "active", "expiration_date": expiration_date, "updated_at": now},
+            "$push": {"applied_payments": payment_id},
+        },
+    )
+    if result.modified_count == 0:
+        raise RuntimeError(f"License {license_id} changed while applying payment {payment_id}")
+    
+    invalidate_license_verdicts(license_doc['license_key'])
+    await revoke_license_tokens([license_doc['license_key']], "payment")
+    if license_doc.get('status') != "active":
+        delta = license_stats_delta(license_doc, -1)
+        delta.update(license_stats_delta({**license_doc, "status": "active"}, 1))
+        await bump_stats(delta)
+    expiring_cache.clear()
+    return True
+
+def payment_amount_error(payment: dict, product: Optional[dict]) -> Optional[str]:
+    """Why an approved payment does not pay for the license's product, or None when it does."""
+    price = product.get('price') if product else None
+    if not price:
+        return "Product has no price"
+    if payment.get("currency_id") != PAYMENT_CURRENCY:
+        return f"Paid in {payment.get('currency_id')}, expected {PAYMENT_CURRENCY}"
+    paid = float(payment.get("transaction_amount") or 0)
+    # Half a cent of slack for float rounding
+    if paid + 0.005 < price:
+        return f"Paid {paid:.2f}, expected {price:.2f}"
+    return None
+
+async def process_payment_event(event: dict):
+    if not valid_payment_id(event['payment_id']):
+        # Queued by an older release that accepted any id
+        await finish_payment_event(event, "failed", last_error="Invalid payment id")
+        return
+    settings = await current_settings()
+    if not settings.mercadopago_access_token:
+        raise PaymentGatewayError("Mercado Pago not configured")
+    
+    payment = await mercadopago_request("GET", f"/v1/payments/{event['payment_id']}", settings.mercadopago_access_token)
+    payment_status = payment.get("status")
+    if payment_status != "approved":
+        # Not final yet (or rejected); a later notification re-queues it
+        await finish_payment_event(event, "ignored", payment_status=payment_status)
+        return
+    
+    license_id = (payment.get("metadata") or {}).get("license_id")
+    if not license_id and payment.get("external_reference"):
+        license_id = payment["external_reference"].split("_", 1)[0]
+    if not license_id:
+        await finish_payment_event(event, "failed", payment_status=payment_status, last_error="Payment has no license reference")
+        return
+    
+    # Checked against the license's product as stored here, not the payment's metadata
+    license_doc = await db.licenses.find_one({"id": license_id}, {"_id": 0, "product_id": 1})
+    product = await db.products.find_one({"id": license_doc['product_id']}, {"_id": 0, "price": 1}) if license_doc else None
+    error = payment_amount_error(payment, product) if license_doc else f"License {license_id} not found"
+    if error:
+        logger.warning(f"Payment {event['payment_id']} not applied to license {license_id}: {error}")
+        await finish_payment_event(event, "failed", payment_status=payment_status, license_id=license_id, last_error=error)
+        return
+    
+    try:
+        applied = await apply_payment_to_license(license_id, event['payment_id'])
+    except LookupError as e:
+        await finish_payment_event(event, "failed", payment_status=payment_status, last_error=str(e))
+        return
+    await finish_payment_event(event, "applied", payment_status=payment_status, license_id=license_id)
+    if applied:
+        logger.info(f"Payment {event['payment_id']} applied to license {license_id}")
+
+async def handle_next_payment_event() -> bool:
+    """Process one due event, scheduling a retry on failure; False when nothing is due."""
+    event = await lease_payment_event()
+    if event is None:
+        return False
+    
+    try:
+        await process_payment_event(event)
+    except (PaymentGatewayError, RuntimeError, PyMongoError) as e:
+        logger.warning(f"Payment event {event['payment_id']} attempt {event['attempts']} failed: {str(e)}")
+        if event['attempts'] >= PAYMENT_EVENT_MAX_ATTEMPTS:
+            await finish_payment_event(event, "failed", last_error=str(e))
+        else:
+            retry_at = datetime.now(timezone.utc) + timedelta(seconds=min(2 ** event['attempts'], 300))
+            await db.payment_events.update_one(
+                {"id": event['id'], "attempts": event['attempts']},
+                {"$set": {"status": "pending", "available_at": retry_at, "last_error": str(e)}},
+            )
+    return True
+
+async def drain_payment_events(limit: int = 20) -> int:
+    """Serverless stand-in for the workers: handle up to limit due events inline."""
+    handled = 0
+    while handled < limit and await handle_next_payment_event():
+        handled += 1
+    return handled
+
+async def run_payment_worker():
+    while True:
+        try:
+            if not await handle_next_payment_event():
+                payment_events_ready.clear()
+                try:
+                    await asyncio.wait_for(payment_events_ready.wait(), PAYMENT_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Payment worker error: {str(e)}")
+            await asyncio.sleep(PAYMENT_POLL_INTERVAL)
+
+# ============= RATE LIMITING =============
+
+# Budgets per group of routes: "route" is shared by every caller, "ip" is per
+# client address and "key" is per license key (or per email for logins).
+# The per-key verify budget is off by default: integrations verify on every
+# page load and older ones treat any non-200 answer as an invalid license.
+RATE_LIMIT_DEFAULTS = {
+    "verify": {"route": "1000/1", "ip": "300/60", "key": "0"},
+    "login": {"route": "50/1", "ip": "20/60", "key": "10/300"},
+    "register": {"route": "20/1", "ip": "10/3600"},
+}
+
+# path -> (group, body field holding the per-key identity)
+RATE_LIMITED_ROUTES = {
+    "/api/verify": ("verify", "license_key"),
+    "/api/verify/batch": ("verify", "license_key"),
+    "/api/verify/token": ("verify", "license_key"),
+    "/api/auth/login": ("login", "email"),
+    "/api/auth/register": ("register", None),
+}
+
+def rate_limit_from_env(name: str, default: str) -> Optional[Tuple[float, float]]:
+    """'<requests>/<seconds>' -> (bucket capacity, tokens refilled per second)."""
+    requests, _, seconds = os.environ.get(name, default).partition('/')
+    if float(requests) <= 0:
+        return None
+    return float(requests), float(requests) / float(seconds or 1)
+
+RATE_LIMITS = {
+    group: {
+        scope: rate_limit_from_env(f"RATE_LIMIT_{group.upper()}_{scope.upper()}", default)
+        for scope, default in budgets.items()
+    }
+    for group, budgets in RATE_LIMIT_DEFAULTS.items()
+}
+
+class RateLimitBackend(ABC):
+    """Token-bucket storage. A shared implementation (e.g. Redis) makes limits hold across replicas."""
+
+    @abstractmethod
+    async def acquire(self, requests: List[Tuple[str, Tuple[float, float], float]]) -> float:
+        """Take `cost` tokens from every (bucket, (capacity, rate), cost) or from none of them.
+
+        Returns 0 when allowed, otherwise the seconds until the request would fit.
+        """
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process buckets in a bounded LRU; an evicted bucket simply starts full again."""
+
+    def __init__(self, max_buckets: int, clock=time.monotonic):
+        self.max_buckets = max_buckets
+        self.clock = clock
+        self.buckets: OrderedDict = OrderedDict()
+
+    async def acquire(self, requests: List[Tuple[str, Tuple[float, float], float]]) -> float:
+        now = self.clock()
+        wait = 0.0
+        levels = []
+        for bucket_key, (capacity, rate), cost in requests:
+            bucket = self.buckets.get(bucket_key)
+            tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            levels.append(tokens - cost)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / rate)
+        if wait:
+            return wait
+
+        for (bucket_key, _, _), tokens in zip(requests, levels):
+            self.buckets[bucket_key] = (tokens, now)
+            self.buckets.move_to_end(bucket_key)
+        while len(self.buckets) > self.max_buckets:
+            self.buckets.popitem(last=False)
+        return 0.0
+
+rate_limit_rejections = Counter()
+
+def client_ip(scope) -> str:
+    if RATE_LIMIT_PROXY_HOPS:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                hops = [hop.strip() for hop in value.decode("latin-1").split(",")]
+                # Entries left of the trusted proxies are client-supplied and can be forged
+                return hops[max(0, len(hops) - RATE_LIMIT_PROXY_HOPS)]
+    return scope["client"][0] if scope.get("client") else "unknown"
+
+def body_identities(body: bytes, field: str) -> List[str]:
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        # Let the route answer with its usual 422
+        return []
+    items = payload if isinstance(payload, list) else [payload]
+    return list({str(item[field]) for item in items if isinstance(item, dict) and item.get(field)})
+
+class RateLimitMiddleware:
+    """ASGI middleware rejecting over-budget requests before the route touches Mongo or bcrypt.
+
+    Route and IP budgets are checked before the body is read; the body is then
+    buffered to find the license keys (or email) and replayed to the route.
+    """
+
+    def __init__(self, app, backend: RateLimitBackend, enabled: bool = True):
+        self.app = app
+        self.backend = backend
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        route = RATE_LIMITED_ROUTES.get(scope["path"]) if scope["type"] == "http" else None
+        if not self.enabled or route is None or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        group, field = route
+        limits = RATE_LIMITS[group]
+        requests = [
+            (f"{group}:{scope_name}:{identity}", limits[scope_name], 1)
+            for scope_name, identity in (("route", "*"), ("ip", client_ip(scope)))
+            if limits.get(scope_name)
+        ]
+        wait = await self.backend.acquire(requests)
+        if wait:
+            await self.reject(scope, receive, send, group, "request", wait)
+            return
+
+        if field and limits.get("key"):
+            body = b""
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                body += message.get("body", b"")
+                more_body = message.get("more_body", False)
+
+            keys = [(f"{group}:key:{identity}", limits["key"], 1) for identity in body_identities(body, field)]
+            wait = await self.backend.acquire(keys) if keys else 0.0
+            if wait:
+                await self.reject(scope, receive, send, group, "key", wait)
+                return
+
+            receive = self.replay(body, receive)
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def replay(body: bytes, receive):
+        replayed = False
+
+        async def replay_receive():
+            nonlocal replayed
+            if replayed:
+                # Later reads only wait for the client to disconnect
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return replay_receive
+
+    async def reject(self, scope, receive, send, group: str, scope_name: str, wait: float):
+        rate_limit_rejections[(group, scope_name)] += 1
+        response = JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests"},
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
+        await response(scope, receive, send)
+
+# ============= METRICS =============
+
+http_requests = Counter()
+http_request_duration = Histogram()
+http_request_phases = Counter()
+http_in_flight = Counter()
+
+class MetricsMiddleware:
+    """Per-route request counts, latency histogram and in-flight gauge, plus the slow-request log.
+
+    Routes are labelled with their path template (/api/licenses/{license_id}),
+    which the router leaves in the scope, so label cardinality stays bounded.
+    Requests the rate limiter rejects never reach the router and are labelled
+    with their rate-limited path instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        phases = {}
+        token = request_phases.set(phases)
+        http_in_flight[method] += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight[method] -= 1
+            request_phases.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                path = getattr(route, "path", "unmatched")
+            elif scope["path"] in RATE_LIMITED_ROUTES:
+                path = scope["path"]
+            else:
+                path = "unmatched"
+            http_requests[(method, path, str(status_code))] += 1
+            http_request_duration.observe((method, path), elapsed)
+            for phase, (seconds, _) in phases.items():
+                http_request_phases[(method, path, phase)] += seconds
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                log_slow_request(method, scope["path"], status_code, elapsed, phases)
+
+def log_slow_request(method: str, path: str, status_code: int, elapsed: float, phases: Dict[str, list]):
+    breakdown = [f"{phase} {seconds * 1000:.1f} ms x{calls}" for phase, (seconds, calls) in sorted(phases.items())]
+    # Handler code and response serialization
+    app_ms = (elapsed - sum(seconds for seconds, _ in phases.values())) * 1000
+    breakdown.append(f"app {max(0.0, app_ms):.1f} ms")
+    logger.warning(f"Slow request: {method} {path} {status_code} in {elapsed * 1000:.1f} ms ({', '.join(breakdown)})")
+
+class PrometheusWriter:
+    """Builds the Prometheus text exposition format (version 0.0.4)."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.lines: List[str] = []
+
+    @staticmethod
+    def labels(names: Tuple[str, ...], values: tuple) -> str:
+        if not names:
+            return ""
+        escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+        return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+    def metric(self, name: str, kind: str, help_text: str, samples, label_names: Tuple[str, ...] = ()):
+        """samples: (label values, value) pairs, or a bare number for an unlabelled metric."""
+        if isinstance(samples, (int, float)):
+            samples = [((), samples)]
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for values, value in samples:
+            self.lines.append(f"{name}{self.labels(label_names, values)} {value}")
+
+    def histogram(self, name: str, help_text: str, histogram: Histogram, label_names: Tuple[str, ...]):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        bounds = [str(bound) for bound in histogram.buckets] + ["+Inf"]
+        for values, cumulative, total, count in histogram.snapshot():
+            for bound, bucket_count in zip(bounds, cumulative):
+                self.lines.append(f"{name}_bucket{self.labels(label_names + ('le',), values + (bound,))} {bucket_count}")
+            self.lines.append(f"{name}_sum{self.labels(label_names, values)} {total}")
+            self.lines.append(f"{name}_count{self.labels(label_names, values)} {count}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+def render_metrics() -> str:
+    out = PrometheusWriter()
+
+    out.metric("http_requests_total", "counter", "HTTP requests by route template and status.",
+               sorted(http_requests.items()), ("method", "route", "status"))
+    out.histogram("http_request_duration_seconds", "HTTP request latency by route template.",
+                  http_request_duration, ("method", "route"))
+    out.metric("http_requests_in_flight", "gauge", "HTTP requests being served.",
+               sorted(((method,), count) for method, count in http_in_flight.items()), ("method",))
+    out.metric("http_request_phase_seconds_total", "counter", "Time requests spent in MongoDB and bcrypt.",
+               sorted(http_request_phases.items()), ("method", "route", "phase"))
+
+    out.histogram("mongodb_command_duration_seconds", "MongoDB command latency by collection and command.",
+                  mongo_commands.durations, ("collection", "command"))
+    with mongo_commands.lock:
+        failures = sorted(mongo_commands.failures.items())
+    out.metric("mongodb_command_failures_total", "counter", "Failed MongoDB commands.",
+               failures, ("collection", "command"))
+    out.metric("password_hash_jobs_pending", "gauge", "bcrypt jobs running or queued.", _pending_password_jobs)
+
+    caches = {"verify": verify_cache, "token": token_cache, "principal": principal_cache, "expiring": expiring_cache}
+    cache_stats = {name: cache.stats() for name, cache in caches.items()}
+    out.metric("cache_entries", "gauge", "Entries held by each in-process cache.",
+               [((name,), stats["size"]) for name, stats in cache_stats.items()], ("cache",))
+    for field in ("hits", "misses", "evictions", "invalidations"):
+        out.metric(f"cache_{field}_total", "counter", f"Cache {field}.",
+                   [((name,), stats[field]) for name, stats in cache_stats.items()], ("cache",))
+
+    key_filter = license_key_filter.stats()
+    out.metric("license_key_filter_ready", "gauge", "Whether the license key Bloom filter is built.", int(key_filter["ready"]))
+    out.metric("license_key_filter_keys", "gauge", "License keys in the Bloom filter.", key_filter["keys"])
+    out.metric("license_key_filter_checks_total", "counter", "Bloom filter lookups by outcome.",
+               [(("passed",), key_filter["passed"]), (("rejected",), key_filter["rejected"]),
+                (("false_positive",), key_filter["false_positives"])], ("result",))
+    out.metric("license_key_filter_rebuilds_total", "counter", "Full Bloom filter rebuilds.", key_filter["rebuilds"])
+
+    out.metric("rate_limit_rejections_total", "counter", "Requests rejected with 429, by route group and budget.",
+               sorted(rate_limit_rejections.items()), ("group", "scope"))
+
+    events = verification_events.stats()
+    out.metric("verification_events_buffered", "gauge", "Verification events waiting to be written.", events["buffered"])
+    out.metric("verification_events_total", "counter", "Verification events by outcome.",
+               [((outcome,), events[outcome]) for outcome in ("enqueued", "dropped", "written", "failed")], ("outcome",))
+    out.metric("verification_event_flushes_total", "counter", "Verification event batches written.", events["flushes"])
+
+    out.metric("background_job_runs_total", "counter", "Leader job runs on this replica.",
+               sorted(((name,), runs) for name, runs in background_job_runs.items()), ("job",))
+    out.metric("background_job_documents_total", "counter", "Documents changed by leader jobs on this replica.",
+               sorted(((name,), count) for name, count in background_job_documents.items()), ("job",))
+    out.metric("background_job_last_duration_seconds", "gauge", "Duration of the last leader job run.",
+               sorted(((name,), seconds) for name, seconds in background_job_last_duration.items()), ("job",))
+
+    out.metric("settings_cache_reloads_total", "counter", "Settings reloads after a version change.", settings_cache.reloads)
+    out.metric("process_uptime_seconds", "gauge", "Seconds since the process started.", round(time.monotonic() - STARTED_AT, 3))
+    return out.render()
+
+@api_router.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape target: METRICS_TOKEN as bearer token or, when unset, an admin login."""
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    else:
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        await get_admin_user(await get_current_user(HTTPAuthorizationCredentials(scheme=scheme, credentials=token)))
+    return Response(render_metrics(), media_type=PrometheusWriter.CONTENT_TYPE)
 
 # Include router
-# app.include_router(api_router)
-app.include_router(api_router, prefix="/api")
+app.router.routes.extend(api_router.routes)
+
+# Added before CORS so 429 responses still carry CORS headers
+app.add_middleware(RateLimitMiddleware, backend=InMemoryRateLimitBackend(RATE_LIMIT_MAX_BUCKETS), enabled=RATE_LIMIT_ENABLED)
+
+# Outside the rate limiter so its 429s are counted per route too
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -534,6 +2826,7 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 logging.basicConfig(
@@ -542,6 +2835,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_db():
+    if SERVERLESS:
+        # Settings load on first use; indexes, stats and queued work are left to /api/maintenance/cron
+        return
+    await ensure_indexes()
+    await backfill_product_names()
+    await backfill_revocation_hashes()
+    await ensure_dashboard_stats()
+    await settings_cache.load()
+    start_background_task(watch_settings())
+    start_background_task(run_leader_job("expiration_sweeper", EXPIRATION_SWEEP_INTERVAL, sweep_expired_licenses))
+    if license_key_filter.enabled:
+        start_background_task(maintain_license_key_filter())
+    for _ in range(PAYMENT_WORKERS):
+        start_background_task(run_payment_worker())
+    if verification_events.enabled:
+        start_background_task(run_verification_event_flusher())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await stop_background_tasks()
+    await verification_events.drain()
+    await close_payment_http()
     client.close()
+    password_executor.shutdown(wait=False)
@@ -0,0 +1,133 @@
+"""Shared fixtures: the app on an in-memory MongoDB and a stub Mercado Pago server.
+
+server.py reads its configuration at import time, so the environment and the
+Motor client are set up here, before the first test module imports it.
+"""
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+
+class StubMercadoPago:
+    """Local HTTP stand-in for the parts of the Mercado Pago API the server calls."""
+
+    def __init__(self):
+        self.payments = {}
+        self.requests = []
+        self.fail_next = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def reset(self):
+        self.payments.clear()
+        self.requests.clear()
+        self.fail_next = 0
+
+    def handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def handle_request(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+                stub.requests.append({"method": method, "path": self.path, "headers": dict(self.headers), "json": body})
+                if stub.fail_next:
+                    stub.fail_next -= 1
+                    return self.reply(503, {"message": "unavailable"})
+
+                if method == "POST" and self.path == "/checkout/preferences":
+                    number = sum(1 for r in stub.requests if r["path"] == self.path)
+                    return self.reply(201, {
+                        "id": f"pref-{number}",
+                        "init_point": f"{stub.url}/checkout/pref-{number}",
+                        "sandbox_init_point": f"{stub.url}/sandbox/pref-{number}",
+                    })
+                if method == "GET" and self.path.startswith("/v1/payments/"):
+                    payment = stub.payments.get(self.path.rsplit("/", 1)[1])
+                    if payment is None:
+                        return self.reply(404, {"message": "not found"})
+                    return self.reply(200, payment)
+                return self.reply(404, {"message": "unknown route"})
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+        return Handler
+
+
+mercadopago = StubMercadoPago()
+
+os.environ.update({
+    "MONGO_URL": "mongodb://localhost:27017",
+    "DB_NAME": "license_manager_test",
+    "MERCADOPAGO_API_URL": mercadopago.url,
+    "PAYMENT_EVENT_MAX_ATTEMPTS": "3",
+    "BCRYPT_ROUNDS": "4",
+    "RATE_LIMIT_ENABLED": "false",
+    "SETTINGS_CHANGE_STREAM": "false",
+})
+
+# In-memory MongoDB; it only understands a subset of the client options
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+import motor.motor_asyncio  # noqa: E402
+
+
+class InMemoryClient(AsyncMongoMockClient):
+    def __init__(self, *args, **kwargs):
+        super().__init__(tz_aware=kwargs.get("tz_aware", False))
+
+
+motor.motor_asyncio.AsyncIOMotorClient = InMemoryClient
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def stub_mercadopago():
+    mercadopago.reset()
+    yield mercadopago
+    mercadopago.reset()
+
+
+@pytest.fixture
+async def db():
+    for name in await server.db.list_collection_names():
+        await server.db.drop_collection(name)
+    await server.ensure_indexes()
+    for cache in (server.verify_cache, server.token_cache, server.principal_cache, server.expiring_cache):
+        cache.clear()
+    yield server.db
+    await server.close_payment_http()
+
+
+@pytest.fixture
+async def client(db):
+    import httpx
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as http:
+        yield http
@@ -0,0 +1,57 @@
+"""Incremental exports pick up every license write, including product-wide ones."""
+import gzip
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import json_util
+
+import backup
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def catalog(db):
+    long_ago = datetime.now(timezone.utc) - timedelta(days=30)
+    product = {"id": str(uuid.uuid4()), "name": "Produto A", "version": "1.0.0", "created_at": long_ago}
+    await db.products.insert_one(dict(product))
+    await db.licenses.insert_one({
+        "id": str(uuid.uuid4()),
+        "license_key": str(uuid.uuid4()),
+        "client_name": "Cliente",
+        "domain": "cliente.com",
+        "product_id": product["id"],
+        "product_name": product["name"],
+        "user_id": "someone",
+        "expiration_date": long_ago + timedelta(days=365),
+        "status": "active",
+        "created_at": long_ago,
+        "updated_at": long_ago,
+    })
+    admin = {"sub": "admin", "email": "admin@example.com", "role": "admin"}
+    await db.users.insert_one({"id": "admin", "email": admin["email"], "password_hash": "x", "role": "admin",
+                               "created_at": long_ago})
+    return {"product": product, "headers": {"Authorization": f"Bearer {server.create_access_token(admin)}"}}
+
+
+async def incremental_licenses(tmp_path, since):
+    await backup.export_collection("licenses", tmp_path, 100, since)
+    [path] = tmp_path.glob("licenses-*-incremental.ndjson.gz")
+    with gzip.open(path, "rt", encoding="utf-8") as lines:
+        return [json_util.loads(line) for line in lines]
+
+
+@pytest.mark.parametrize("change", ["rename", "delete"])
+async def test_product_changes_reach_incremental_exports(client, db, catalog, tmp_path, change):
+    since = datetime.now(timezone.utc) - timedelta(minutes=1)
+    url = f"/api/products/{catalog['product']['id']}"
+    if change == "rename":
+        body = {"name": "Produto B", "version": "1.0.0"}
+        assert (await client.put(url, json=body, headers=catalog["headers"])).status_code == 200
+    else:
+        assert (await client.delete(url, headers=catalog["headers"])).status_code == 200
+
+    [exported] = await incremental_licenses(tmp_path, since)
+    assert exported["product_name"] == ("Produto B" if change == "rename" else None)
@@ -0,0 +1,60 @@
+"""Dashboard counters: kept with $inc, created only by a full rebuild."""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def admin_headers(db):
+    user = {"id": str(uuid.uuid4()), "email": "admin@example.com", "password_hash": "x", "role": "admin",
+            "created_at": datetime.now(timezone.utc)}
+    await db.users.insert_one(dict(user))
+    token = server.create_access_token({"sub": user["id"], "email": user["email"], "role": "admin"})
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def seed_licenses(db, count):
+    now = datetime.now(timezone.utc)
+    product_id = str(uuid.uuid4())
+    await db.products.insert_one({"id": product_id, "name": "Produto A", "version": "1.0.0", "created_at": now})
+    await db.licenses.insert_many([{
+        "id": str(uuid.uuid4()),
+        "license_key": str(uuid.uuid4()),
+        "client_name": f"Cliente {i}",
+        "domain": f"cliente{i}.com",
+        "product_id": product_id,
+        "product_name": "Produto A",
+        "user_id": "someone",
+        "expiration_date": now + timedelta(days=365),
+        "status": "active",
+        "created_at": now,
+    } for i in range(count)])
+
+
+async def test_writes_before_the_first_rebuild_do_not_leave_partial_counters(client, db, admin_headers):
+    await seed_licenses(db, 50)
+    response = await client.post("/api/auth/register", json={"email": "novo@example.com", "password": "segredo123"})
+    assert response.status_code == 200
+    assert await db.stats.find_one({"id": server.STATS_ID}) is None
+
+    stats = (await client.get("/api/dashboard/stats", headers=admin_headers)).json()
+    assert (stats["total_licenses"], stats["total_products"], stats["total_users"]) == (50, 1, 2)
+
+    # Once the document exists, writes keep it current
+    await client.post("/api/auth/register", json={"email": "outro@example.com", "password": "segredo123"})
+    stats = (await client.get("/api/dashboard/stats", headers=admin_headers)).json()
+    assert stats["total_users"] == 3
+
+
+async def test_partial_documents_from_older_releases_are_rebuilt(client, db, admin_headers):
+    await seed_licenses(db, 5)
+    await db.stats.insert_one({"id": server.STATS_ID, "total_users": 1})
+
+    await server.ensure_dashboard_stats()
+    stats = (await client.get("/api/dashboard/stats", headers=admin_headers)).json()
+    assert (stats["total_licenses"], stats["total_products"], stats["total_users"]) == (5, 1, 1)
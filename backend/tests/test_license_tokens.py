@@ -0,0 +1,102 @@
+"""Offline license tokens: signing, the public key and the revocation feed."""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    pem = Ed25519PrivateKey.generate().private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    monkeypatch.setattr(server, "LICENSE_SIGNING_KEY", pem)
+    monkeypatch.setattr(server, "_signing_key", None)
+    return pem
+
+
+@pytest.fixture
+async def license_doc(db):
+    now = datetime.now(timezone.utc)
+    doc = {
+        "id": str(uuid.uuid4()),
+        "license_key": str(uuid.uuid4()),
+        "client_name": "Cliente",
+        "domain": "cliente.com",
+        "product_id": str(uuid.uuid4()),
+        "product_name": "Produto A",
+        "user_id": "someone",
+        "expiration_date": now + timedelta(days=30),
+        "status": "active",
+        "created_at": now,
+    }
+    await db.licenses.insert_one(dict(doc))
+    server.license_key_filter.add(doc["license_key"])
+    return doc
+
+
+def verify_body(license_doc):
+    return {"license_key": license_doc["license_key"], "domain": "cliente.com", "product_name": "Produto A"}
+
+
+async def test_tokens_are_refused_without_a_configured_key(client, license_doc, monkeypatch):
+    monkeypatch.setattr(server, "LICENSE_SIGNING_KEY", None)
+    monkeypatch.setattr(server, "_signing_key", None)
+
+    assert (await client.post("/api/verify/token", json=verify_body(license_doc))).status_code == 503
+    assert (await client.get("/api/verify/public-key")).status_code == 503
+
+
+async def test_tokens_verify_against_the_published_key(client, license_doc, signing_key):
+    response = await client.post("/api/verify/token", json=verify_body(license_doc))
+    assert response.status_code == 200
+    token = response.json()["token"]
+
+    public = (await client.get("/api/verify/public-key")).json()
+    claims = jwt.decode(token, public["public_key_pem"], algorithms=["EdDSA"])
+    assert (claims["sub"], claims["domain"]) == (license_doc["license_key"], "cliente.com")
+    assert jwt.get_unverified_header(token)["kid"] == public["key_id"]
+
+
+async def follow_feed(client, **params):
+    delivered = []
+    while True:
+        page = (await client.get("/api/verify/revocations", params={"limit": 250, **params})).json()
+        delivered += page["revocations"]
+        params["after"] = page["next_cursor"]
+        if not page["has_more"]:
+            return delivered, page["next_cursor"]
+
+
+async def test_feed_delivers_whole_batches_across_pages(client, db):
+    # Each call stamps its whole batch with one revoked_at
+    await server.revoke_license_tokens([f"a{i}" for i in range(600)], "product_renamed")
+    await server.revoke_license_tokens([f"b{i}" for i in range(1000)], "product_renamed")
+
+    delivered, cursor = await follow_feed(client)
+    assert len(delivered) == 1600
+    assert {row["key_hash"] for row in delivered} == (
+        {server.license_key_hash(f"a{i}") for i in range(600)} | {server.license_key_hash(f"b{i}") for i in range(1000)}
+    )
+
+    # Picking up from the saved cursor returns only what came after it
+    page = (await client.get("/api/verify/revocations", params={"after": cursor})).json()
+    assert page == {"revocations": [], "next_cursor": cursor, "has_more": False}
+    await server.revoke_license_tokens(["c0"], "license_deleted")
+    page = (await client.get("/api/verify/revocations", params={"after": cursor})).json()
+    assert [row["key_hash"] for row in page["revocations"]] == [server.license_key_hash("c0")]
+
+
+async def test_feed_filters_by_key_hash_and_rejects_bad_cursors(client, db):
+    await server.revoke_license_tokens(["k1", "k2", "k1"], "license_updated")
+
+    delivered, _ = await follow_feed(client, key_hash=server.license_key_hash("k1").upper())
+    assert len(delivered) == 2
+    assert (await client.get("/api/verify/revocations", params={"after": "not-a-cursor"})).status_code == 400
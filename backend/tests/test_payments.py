@@ -0,0 +1,262 @@
+"""Mercado Pago flow against the local stub: preferences, webhook queue and payment workers."""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+PRICE = 49.9
+
+
+@pytest.fixture
+async def shop(db):
+    """Payments enabled, a priced product, a customer and one of their licenses."""
+    await db.settings.insert_one({
+        "id": "settings",
+        "enable_payments": True,
+        "mercadopago_access_token": "TEST-token",
+        "version": 1,
+    })
+    await server.settings_cache.load()
+
+    now = datetime.now(timezone.utc)
+    product = {"id": str(uuid.uuid4()), "name": "Produto A", "version": "1.0.0", "price": PRICE, "created_at": now}
+    user = {"id": str(uuid.uuid4()), "email": "cliente@example.com", "password_hash": "x", "role": "user", "created_at": now}
+    license_doc = {
+        "id": str(uuid.uuid4()),
+        "license_key": str(uuid.uuid4()),
+        "client_name": "Cliente",
+        "domain": "cliente.com",
+        "product_id": product["id"],
+        "product_name": product["name"],
+        "user_id": user["id"],
+        "expiration_date": now + timedelta(days=10),
+        "status": "active",
+        "created_at": now,
+        "updated_at": now,
+    }
+    await db.products.insert_one(dict(product))
+    await db.users.insert_one(dict(user))
+    await db.licenses.insert_one(dict(license_doc))
+    token = server.create_access_token({"sub": user["id"], "email": user["email"], "role": "user"})
+    return {
+        "product": product,
+        "license": license_doc,
+        "headers": {"Authorization": f"Bearer {token}"},
+    }
+
+
+def approved_payment(shop, payment_id="1001", **fields):
+    return {
+        "id": int(payment_id),
+        "status": "approved",
+        "transaction_amount": PRICE,
+        "currency_id": "BRL",
+        "external_reference": f"{shop['license']['id']}_{shop['product']['id']}",
+        "metadata": {"license_id": shop["license"]["id"]},
+        **fields,
+    }
+
+
+async def notify(client, payment_id="1001"):
+    response = await client.post("/api/webhook/mercadopago", json={"type": "payment", "data": {"id": payment_id}})
+    assert response.status_code == 200
+    return response.json()
+
+
+async def expiration(db, license_id):
+    doc = await db.licenses.find_one({"id": license_id})
+    return doc["expiration_date"]
+
+
+async def make_due(db, payment_id):
+    await db.payment_events.update_one(
+        {"payment_id": payment_id}, {"$set": {"available_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+
+
+async def test_preference_charges_the_product_price(client, shop, stub_mercadopago):
+    response = await client.post("/api/create-payment-preference", headers=shop["headers"], json={
+        "title": "Renovação",
+        "description": "Produto A por 1 ano",
+        "product_id": shop["product"]["id"],
+        "license_id": shop["license"]["id"],
+        "amount": 0.01,
+    })
+
+    assert response.status_code == 200
+    assert response.json()["preference_id"] == "pref-1"
+    sent = stub_mercadopago.requests[-1]
+    assert sent["headers"]["Authorization"] == "Bearer TEST-token"
+    assert sent["headers"]["X-Idempotency-Key"]
+    assert sent["json"]["items"][0]["unit_price"] == PRICE
+    assert sent["json"]["items"][0]["currency_id"] == "BRL"
+    assert sent["json"]["metadata"]["license_id"] == shop["license"]["id"]
+
+
+async def test_preference_rejects_unpriced_products_and_foreign_licenses(client, db, shop, stub_mercadopago):
+    body = {"title": "t", "description": "d", "product_id": shop["product"]["id"], "license_id": shop["license"]["id"]}
+    await db.licenses.update_one({"id": shop["license"]["id"]}, {"$set": {"user_id": "someone-else"}})
+    assert (await client.post("/api/create-payment-preference", headers=shop["headers"], json=body)).status_code == 404
+
+    await db.products.update_one({"id": shop["product"]["id"]}, {"$set": {"price": None}})
+    assert (await client.post("/api/create-payment-preference", headers=shop["headers"], json=body)).status_code == 400
+    assert stub_mercadopago.requests == []
+
+
+async def test_preference_gateway_error_is_502(client, shop, stub_mercadopago):
+    stub_mercadopago.fail_next = 1
+    response = await client.post("/api/create-payment-preference", headers=shop["headers"], json={
+        "title": "t", "description": "d", "product_id": shop["product"]["id"], "license_id": shop["license"]["id"],
+    })
+    assert response.status_code == 502
+
+
+async def test_webhook_is_idempotent(client, db, shop, stub_mercadopago):
+    for _ in range(3):
+        assert await notify(client) == {"status": "ok"}
+    assert await db.payment_events.count_documents({"payment_id": "1001"}) == 1
+
+    ignored = await client.post("/api/webhook/mercadopago", json={"type": "plan", "data": {"id": "1"}})
+    assert ignored.json() == {"status": "ignored"}
+    assert await db.payment_events.count_documents({}) == 1
+    # Queuing never calls the gateway; the workers do
+    assert stub_mercadopago.requests == []
+
+
+@pytest.mark.parametrize("payment_id", ["../../users/me", "1001?x=1", "1001/../2", "١٠٠١", "", "1" * 65])
+async def test_webhook_ignores_non_numeric_payment_ids(client, db, stub_mercadopago, payment_id):
+    response = await client.post("/api/webhook/mercadopago", json={"type": "payment", "data": {"id": payment_id}})
+    assert response.json() == {"status": "ignored"}
+    assert await db.payment_events.count_documents({}) == 0
+
+
+async def test_queued_non_numeric_payment_ids_never_reach_the_gateway(db, shop, stub_mercadopago):
+    now = datetime.now(timezone.utc)
+    await db.payment_events.insert_one({
+        "id": str(uuid.uuid4()), "payment_id": "../../users/me", "status": "pending",
+        "attempts": 0, "available_at": now, "created_at": now,
+    })
+
+    assert await server.handle_next_payment_event()
+    event = await db.payment_events.find_one({"payment_id": "../../users/me"})
+    assert (event["status"], event["last_error"]) == ("failed", "Invalid payment id")
+    assert stub_mercadopago.requests == []
+
+
+async def test_approved_payment_activates_and_extends_the_license(client, db, shop, stub_mercadopago):
+    await db.licenses.update_one({"id": shop["license"]["id"]}, {"$set": {"status": "inactive"}})
+    before = await expiration(db, shop["license"]["id"])
+    stub_mercadopago.payments["1001"] = approved_payment(shop)
+
+    await notify(client)
+    assert await server.handle_next_payment_event()
+
+    license_doc = await db.licenses.find_one({"id": shop["license"]["id"]})
+    assert license_doc["status"] == "active"
+    assert license_doc["expiration_date"] - before == timedelta(days=server.PAYMENT_LICENSE_EXTENSION_DAYS)
+    assert license_doc["applied_payments"] == ["1001"]
+    event = await db.payment_events.find_one({"payment_id": "1001"})
+    assert event["status"] == "applied"
+    assert await db.revocations.count_documents({"reason": "payment"}) == 1
+
+
+async def test_pending_payment_is_ignored_until_notified_again(client, db, shop, stub_mercadopago):
+    before = await expiration(db, shop["license"]["id"])
+    stub_mercadopago.payments["1001"] = approved_payment(shop, status="in_process")
+
+    await notify(client)
+    assert await server.handle_next_payment_event()
+    event = await db.payment_events.find_one({"payment_id": "1001"})
+    assert (event["status"], event["payment_status"]) == ("ignored", "in_process")
+    assert await expiration(db, shop["license"]["id"]) == before
+    assert not await server.handle_next_payment_event()
+
+    stub_mercadopago.payments["1001"]["status"] = "approved"
+    await notify(client)
+    assert await server.handle_next_payment_event()
+    assert (await db.payment_events.find_one({"payment_id": "1001"}))["status"] == "applied"
+    assert await expiration(db, shop["license"]["id"]) > before
+
+
+@pytest.mark.parametrize("fields, error", [
+    ({"transaction_amount": 0.01}, "Paid 0.01, expected 49.90"),
+    ({"currency_id": "USD"}, "Paid in USD, expected BRL"),
+])
+async def test_wrong_amount_or_currency_is_not_applied(client, db, shop, stub_mercadopago, fields, error):
+    before = await expiration(db, shop["license"]["id"])
+    stub_mercadopago.payments["1001"] = approved_payment(shop, **fields)
+
+    await notify(client)
+    assert await server.handle_next_payment_event()
+
+    event = await db.payment_events.find_one({"payment_id": "1001"})
+    assert (event["status"], event["last_error"]) == ("failed", error)
+    license_doc = await db.licenses.find_one({"id": shop["license"]["id"]})
+    assert license_doc["expiration_date"] == before
+    assert "applied_payments" not in license_doc
+
+
+async def test_gateway_failures_retry_with_backoff(client, db, shop, stub_mercadopago):
+    stub_mercadopago.payments["1001"] = approved_payment(shop)
+    stub_mercadopago.fail_next = 2
+    await notify(client)
+
+    started = datetime.now(timezone.utc)
+    assert await server.handle_next_payment_event()
+    event = await db.payment_events.find_one({"payment_id": "1001"})
+    assert (event["status"], event["attempts"]) == ("pending", 1)
+    assert "503" in event["last_error"]
+    assert event["available_at"] - started >= timedelta(seconds=1)
+    # Not due yet
+    assert not await server.handle_next_payment_event()
+
+    await make_due(db, "1001")
+    assert await server.handle_next_payment_event()
+    event = await db.payment_events.find_one({"payment_id": "1001"})
+    assert (event["status"], event["attempts"]) == ("pending", 2)
+    assert event["available_at"] - started >= timedelta(seconds=3)
+
+    await make_due(db, "1001")
+    assert await server.handle_next_payment_event()
+    assert (await db.payment_events.find_one({"payment_id": "1001"}))["status"] == "applied"
+
+
+async def test_gateway_failures_give_up_after_max_attempts(client, db, shop, stub_mercadopago):
+    stub_mercadopago.payments["1001"] = approved_payment(shop)
+    stub_mercadopago.fail_next = server.PAYMENT_EVENT_MAX_ATTEMPTS
+    await notify(client)
+
+    for _ in range(server.PAYMENT_EVENT_MAX_ATTEMPTS):
+        await make_due(db, "1001")
+        assert await server.handle_next_payment_event()
+
+    event = await db.payment_events.find_one({"payment_id": "1001"})
+    assert (event["status"], event["attempts"]) == ("failed", server.PAYMENT_EVENT_MAX_ATTEMPTS)
+    # A new notification gives it another round
+    await notify(client)
+    assert (await db.payment_events.find_one({"payment_id": "1001"}))["status"] == "pending"
+
+
+async def test_payment_is_applied_only_once(client, db, shop, stub_mercadopago):
+    before = await expiration(db, shop["license"]["id"])
+    stub_mercadopago.payments["1001"] = approved_payment(shop)
+
+    await notify(client)
+    assert await server.handle_next_payment_event()
+    # Redelivered notifications do not re-queue an applied payment
+    await notify(client)
+    await notify(client)
+    assert not await server.handle_next_payment_event()
+
+    # Even a stale worker processing the same payment again changes nothing
+    event = await db.payment_events.find_one({"payment_id": "1001"})
+    await server.process_payment_event(event)
+    assert not await server.apply_payment_to_license(shop["license"]["id"], "1001")
+
+    license_doc = await db.licenses.find_one({"id": shop["license"]["id"]})
+    assert license_doc["expiration_date"] - before == timedelta(days=server.PAYMENT_LICENSE_EXTENSION_DAYS)
+    assert license_doc["applied_payments"] == ["1001"]
@@ -0,0 +1,147 @@
+"""Token buckets and the middleware that enforces them, on a fake clock."""
+import json
+
+import httpx
+import pytest
+from fastapi.responses import JSONResponse
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def backend(clock):
+    return server.InMemoryRateLimitBackend(max_buckets=100, clock=clock)
+
+
+# 3 requests per 6 seconds: a full bucket holds 3 tokens and refills 0.5 per second
+BUDGET = (3.0, 0.5)
+
+
+async def test_allows_up_to_capacity_then_reports_the_wait(backend):
+    for _ in range(3):
+        assert await backend.acquire([("b", BUDGET, 1)]) == 0
+    assert await backend.acquire([("b", BUDGET, 1)]) == pytest.approx(2.0)
+    # A rejected request takes nothing
+    assert await backend.acquire([("b", BUDGET, 1)]) == pytest.approx(2.0)
+
+
+async def test_refills_over_time_up_to_capacity(backend, clock):
+    for _ in range(3):
+        await backend.acquire([("b", BUDGET, 1)])
+
+    clock.now += 2
+    assert await backend.acquire([("b", BUDGET, 1)]) == 0
+    assert await backend.acquire([("b", BUDGET, 1)]) == pytest.approx(2.0)
+
+    clock.now += 3600
+    for _ in range(3):
+        assert await backend.acquire([("b", BUDGET, 1)]) == 0
+    assert await backend.acquire([("b", BUDGET, 1)]) > 0
+
+
+async def test_takes_from_every_bucket_or_from_none(backend):
+    assert await backend.acquire([("full", BUDGET, 1), ("empty", BUDGET, 3)]) == 0
+    # "empty" has no tokens left, so "full" must not be charged either
+    assert await backend.acquire([("full", BUDGET, 1), ("empty", BUDGET, 1)]) == pytest.approx(2.0)
+    assert await backend.acquire([("full", BUDGET, 2)]) == 0
+    assert await backend.acquire([("full", BUDGET, 1)]) > 0
+
+
+async def test_evicts_the_least_recently_used_bucket(clock):
+    backend = server.InMemoryRateLimitBackend(max_buckets=2, clock=clock)
+    await backend.acquire([("a", BUDGET, 3)])
+    await backend.acquire([("b", BUDGET, 3)])
+    await backend.acquire([("c", BUDGET, 3)])
+
+    assert list(backend.buckets) == ["b", "c"]
+    # The evicted bucket starts full again
+    assert await backend.acquire([("a", BUDGET, 1)]) == 0
+    assert list(backend.buckets) == ["c", "a"]
+
+
+def test_backends_must_implement_acquire():
+    class Incomplete(server.RateLimitBackend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.fixture
+def limited(backend, monkeypatch):
+    """The middleware around an app that echoes the body, with tiny verify budgets."""
+    monkeypatch.setitem(server.RATE_LIMITS, "verify", {"route": (100.0, 100.0), "ip": (3.0, 0.5), "key": (2.0, 0.5)})
+    monkeypatch.setattr(server, "RATE_LIMIT_PROXY_HOPS", 0)
+    seen = []
+
+    async def app(scope, receive, send):
+        message = await receive()
+        seen.append(message["body"])
+        await JSONResponse({"valid": True})(scope, receive, send)
+
+    middleware = server.RateLimitMiddleware(app, backend=backend)
+    middleware.seen = seen
+    return middleware
+
+
+async def post(middleware, path, json, ip="10.0.0.1"):
+    transport = httpx.ASGITransport(app=middleware, client=(ip, 1234))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        return await http.post(path, json=json)
+
+
+async def test_rejects_over_budget_keys_with_retry_after(limited):
+    body = {"license_key": "k1", "domain": "a.com", "product_name": "A"}
+    for _ in range(2):
+        assert (await post(limited, "/api/verify", body)).status_code == 200
+    # The route still receives the buffered body
+    assert json.loads(limited.seen[-1]) == body
+
+    response = await post(limited, "/api/verify", body)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert server.rate_limit_rejections[("verify", "key")] >= 1
+
+    other_key = {**body, "license_key": "k2"}
+    assert (await post(limited, "/api/verify", other_key)).status_code == 429  # the IP budget is spent too
+    assert (await post(limited, "/api/verify", other_key, ip="10.0.0.2")).status_code == 200
+
+
+async def test_unlimited_routes_and_disabled_limiter_pass_through(limited):
+    for _ in range(5):
+        assert (await post(limited, "/api/products", {})).status_code == 200
+    limited.enabled = False
+    for _ in range(5):
+        assert (await post(limited, "/api/verify", {"license_key": "k1"})).status_code == 200
+
+
+def test_verify_key_budget_is_off_by_default():
+    assert server.rate_limit_from_env("RATE_LIMIT_UNSET_FOR_TEST", server.RATE_LIMIT_DEFAULTS["verify"]["key"]) is None
+    assert server.rate_limit_from_env("RATE_LIMIT_UNSET_FOR_TEST", "60/30") == (60.0, 2.0)
+
+
+async def test_rejections_are_counted_per_route_by_the_metrics(limited):
+    # user_middleware is listed outermost first
+    order = [middleware.cls for middleware in server.app.user_middleware]
+    assert order.index(server.MetricsMiddleware) < order.index(server.RateLimitMiddleware)
+
+    metrics = server.MetricsMiddleware(limited)
+    before = server.http_requests[("POST", "/api/verify", "429")]
+    for _ in range(3):
+        await post(metrics, "/api/verify", {"license_key": "k1"})
+    assert server.http_requests[("POST", "/api/verify", "429")] == before + 1
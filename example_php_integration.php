@@ -68,8 +68,8 @@ function verificarLicencaComCache() {
         }
     }
     
-    // Fazer verificação
-    $isValid = verificarLicenca();
+    // Fazer verificação (em caso de 429 ou falha de rede vale o último veredito)
+    $isValid = verificarLicencaDetalhada()['valid'] ?? false;
     
     // Salvar cache
     file_put_contents($cacheFile, json_encode([
@@ -82,9 +82,14 @@ function verificarLicencaComCache() {
 
 /**
  * Verificação com informações detalhadas
+ *
+ * A API sempre responde 200 com o veredito. Qualquer outra resposta (429 por
+ * limite de requisições, 5xx, falha de rede) não diz nada sobre a licença,
+ * então o último veredito recebido continua valendo.
  */
 function verificarLicencaDetalhada() {
     $domain = $_SERVER['HTTP_HOST'];
+    $arquivo = sys_get_temp_dir() . '/license_verdict_' . md5(LICENSE_KEY) . '.json';
     
     $data = [
         'license_key' => LICENSE_KEY,
@@ -100,9 +105,24 @@ function verificarLicencaDetalhada() {
     curl_setopt($ch, CURLOPT_TIMEOUT, 10);
     
     $response = curl_exec($ch);
+    $httpCode = curl_getinfo($ch, CURLINFO_HTTP_CODE);
+    $error = curl_error($ch);
     curl_close($ch);
     
-    return json_decode($response, true);
+    $result = $httpCode === 200 ? json_decode($response, true) : null;
+    if (is_array($result) && isset($result['valid'])) {
+        file_put_contents($arquivo, json_encode($result));
+        return $result;
+    }
+    
+    error_log("Erro ao verificar licença: HTTP $httpCode - $error");
+    if (file_exists($arquivo)) {
+        $ultimo = json_decode(file_get_contents($arquivo), true);
+        if (is_array($ultimo)) {
+            return $ultimo;
+        }
+    }
+    return ['valid' => false, 'message' => 'Não foi possível verificar a licença'];
 }
 
 /**
@@ -180,6 +200,175 @@ function mostrarErroLicenca($mensagem = '') {
     exit;
 }
 
+// ==================== VERIFICAÇÃO OFFLINE (TOKEN ASSINADO) ====================
+//
+// Em vez de chamar /api/verify a cada página, o servidor emite um token assinado
+// (Ed25519) que é validado localmente, sem rede. A API só é consultada para
+// renovar o token e para baixar, de forma incremental, as revogações desta chave.
+// Requer a extensão sodium (incluída no PHP desde a versão 7.2).
+
+define('LICENSE_API_BASE', 'https://project-gate.preview.emergentagent.com/api');
+define('LICENSE_PUBLIC_KEY', 'COLE_AQUI_A_CHAVE_PUBLICA'); // campo "public_key" de GET /api/verify/public-key
+define('LICENSE_TOKEN_REFRESH', 21600); // Renovar o token a cada 6 horas
+define('LICENSE_REVOCATION_REFRESH', 3600); // Consultar revogações a cada 1 hora
+
+function base64UrlDecode($data) {
+    return base64_decode(strtr($data, '-_', '+/') . str_repeat('=', (4 - strlen($data) % 4) % 4));
+}
+
+function arquivoCacheLicenca($nome) {
+    return sys_get_temp_dir() . '/license_' . $nome . '_' . md5(LICENSE_KEY) . '.json';
+}
+
+/**
+ * Valida assinatura e claims do token localmente.
+ * Retorna as claims se o token for válido para esta instalação, ou null.
+ */
+function validarTokenOffline($token) {
+    $partes = explode('.', $token);
+    if (count($partes) !== 3) {
+        return null;
+    }
+    list($headerB64, $payloadB64, $assinaturaB64) = $partes;
+    
+    $header = json_decode(base64UrlDecode($headerB64), true);
+    if (!$header || ($header['alg'] ?? '') !== 'EdDSA') {
+        return null;
+    }
+    
+    $assinatura = base64UrlDecode($assinaturaB64);
+    $chavePublica = base64_decode(LICENSE_PUBLIC_KEY);
+    if (strlen($assinatura) !== SODIUM_CRYPTO_SIGN_BYTES ||
+        strlen($chavePublica) !== SODIUM_CRYPTO_SIGN_PUBLICKEYBYTES) {
+        return null;
+    }
+    if (!sodium_crypto_sign_verify_detached($assinatura, "$headerB64.$payloadB64", $chavePublica)) {
+        return null;
+    }
+    
+    $claims = json_decode(base64UrlDecode($payloadB64), true);
+    if (!$claims ||
+        ($claims['exp'] ?? 0) < time() ||
+        ($claims['sub'] ?? '') !== LICENSE_KEY ||
+        ($claims['domain'] ?? '') !== $_SERVER['HTTP_HOST'] ||
+        ($claims['product'] ?? '') !== PRODUCT_NAME ||
+        ($claims['status'] ?? '') !== 'active') {
+        return null;
+    }
+    return $claims;
+}
+
+/**
+ * Pede um token novo em POST /api/verify/token.
+ * Retorna a resposta da API, ou null se a API estiver inacessível.
+ */
+function obterTokenLicenca() {
+    $ch = curl_init(LICENSE_API_BASE . '/verify/token');
+    curl_setopt($ch, CURLOPT_RETURNTRANSFER, true);
+    curl_setopt($ch, CURLOPT_POST, true);
+    curl_setopt($ch, CURLOPT_POSTFIELDS, json_encode([
+        'license_key' => LICENSE_KEY,
+        'domain' => $_SERVER['HTTP_HOST'],
+        'product_name' => PRODUCT_NAME
+    ]));
+    curl_setopt($ch, CURLOPT_HTTPHEADER, ['Content-Type: application/json']);
+    curl_setopt($ch, CURLOPT_TIMEOUT, 10);
+    
+    $response = curl_exec($ch);
+    $httpCode = curl_getinfo($ch, CURLINFO_HTTP_CODE);
+    curl_close($ch);
+    
+    if ($httpCode !== 200) {
+        return null;
+    }
+    return json_decode($response, true);
+}
+
+/**
+ * Atualiza as revogações desta chave (só o que mudou desde a última consulta)
+ * e retorna o instante da mais recente (0 se nenhuma). A API identifica a
+ * chave pelo hash SHA-256; a chave em si nunca é enviada nem publicada.
+ */
+function ultimaRevogacaoLicenca() {
+    $arquivo = arquivoCacheLicenca('revocations');
+    $estado = file_exists($arquivo) ? json_decode(file_get_contents($arquivo), true) : null;
+    if (!$estado) {
+        $estado = ['cursor' => null, 'checked_at' => 0, 'revoked_at_ts' => 0];
+    }
+    
+    if (time() - $estado['checked_at'] >= LICENSE_REVOCATION_REFRESH) {
+        $hashChave = hash('sha256', LICENSE_KEY);
+        do {
+            $url = LICENSE_API_BASE . '/verify/revocations?key_hash=' . $hashChave;
+            if (!empty($estado['cursor'])) {
+                $url .= '&after=' . urlencode($estado['cursor']);
+            }
+            $ch = curl_init($url);
+            curl_setopt($ch, CURLOPT_RETURNTRANSFER, true);
+            curl_setopt($ch, CURLOPT_TIMEOUT, 10);
+            $response = curl_exec($ch);
+            $httpCode = curl_getinfo($ch, CURLINFO_HTTP_CODE);
+            curl_close($ch);
+            
+            if ($httpCode !== 200) {
+                break; // Sem rede: mantém o que já se sabe
+            }
+            $result = json_decode($response, true);
+            foreach ($result['revocations'] as $revogacao) {
+                if ($revogacao['key_hash'] === $hashChave) {
+                    $estado['revoked_at_ts'] = max($estado['revoked_at_ts'], $revogacao['revoked_at_ts']);
+                }
+            }
+            if ($result['next_cursor']) {
+                $estado['cursor'] = $result['next_cursor'];
+            }
+        } while ($result['has_more']);
+        
+        $estado['checked_at'] = time();
+        file_put_contents($arquivo, json_encode($estado));
+    }
+    return $estado['revoked_at_ts'];
+}
+
+/**
+ * Verificação offline: usa o token em cache e só vai à API para renová-lo.
+ * Se a API estiver fora do ar, o token atual continua valendo até expirar.
+ */
+function verificarLicencaOffline() {
+    $arquivo = arquivoCacheLicenca('token');
+    $cache = file_exists($arquivo) ? json_decode(file_get_contents($arquivo), true) : null;
+    $claims = !empty($cache['token']) ? validarTokenOffline($cache['token']) : null;
+    
+    // Token emitido antes de uma revogação não vale mais
+    $revogadaEm = ultimaRevogacaoLicenca();
+    if ($claims && $claims['iat'] <= $revogadaEm) {
+        $claims = null;
+    }
+    
+    if ($claims && time() - $claims['iat'] < LICENSE_TOKEN_REFRESH) {
+        return true;
+    }
+    
+    $result = obterTokenLicenca();
+    if ($result === null) {
+        // API fora do ar ou sem tokens configurados: sem token válido, vale a verificação online
+        return $claims !== null || (verificarLicencaDetalhada()['valid'] ?? false);
+    }
+    if (empty($result['valid']) || empty($result['token'])) {
+        @unlink($arquivo);
+        return false;
+    }
+    
+    $novasClaims = validarTokenOffline($result['token']);
+    if (!$novasClaims) {
+        // Assinado com outra chave (servidor mal configurado): não diz nada sobre a licença
+        error_log('Token de licença não confere com LICENSE_PUBLIC_KEY');
+        return $claims !== null || (verificarLicencaDetalhada()['valid'] ?? false);
+    }
+    file_put_contents($arquivo, json_encode(['token' => $result['token']]));
+    return true;
+}
+
 // ==================== EXEMPLOS DE USO ====================
 
 // EXEMPLO 1: Verificação simples (bloqueia se inválido)
@@ -222,8 +411,8 @@ class LicenseMiddleware {
             }
         }
         
-        // Fazer verificação
-        $isValid = verificarLicenca();
+        // Fazer verificação (em caso de 429 ou falha de rede vale o último veredito)
+        $isValid = verificarLicencaDetalhada()['valid'] ?? false;
         
         $_SESSION['license_valid'] = $isValid;
         $_SESSION['license_checked_at'] = time();
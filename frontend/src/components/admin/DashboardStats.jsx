@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
-import { Key, Package, Users, CheckCircle } from 'lucide-react';
+import { Key, Package, Users, CheckCircle, Clock } from 'lucide-react';
 import { toast } from 'sonner';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -12,7 +12,8 @@ export default function DashboardStats() {
     total_licenses: 0,
     active_licenses: 0,
     total_products: 0,
-    total_users: 0
+    total_users: 0,
+    expiring_soon: { days: 30, count: 0 }
   });
   const [loading, setLoading] = useState(true);
 
@@ -62,6 +63,13 @@ export default function DashboardStats() {
       icon: Users,
       color: 'from-orange-500 to-red-600',
       testId: 'stat-users'
+    },
+    {
+      title: `Expirando em ${stats.expiring_soon.days} dias`,
+      value: stats.expiring_soon.count,
+      icon: Clock,
+      color: 'from-amber-500 to-yellow-600',
+      testId: 'stat-expiring-soon'
     }
   ];
 
@@ -80,7 +88,7 @@ export default function DashboardStats() {
         <p className="text-slate-600">Visão geral do sistema de licenças</p>
       </div>
 
-      <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
+      <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-5 gap-6">
         {statCards.map((stat) => {
           const Icon = stat.icon;
           return (
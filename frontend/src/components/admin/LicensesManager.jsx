@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
+import { fetchAllPages, fetchPage } from '@/lib/pagination';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
@@ -16,12 +17,19 @@ import { ptBR } from 'date-fns/locale';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 50;
+const EMPTY_FILTERS = { client_name: '', domain: '', status: 'all', product_id: 'all' };
 
 export default function LicensesManager() {
   const [licenses, setLicenses] = useState([]);
   const [products, setProducts] = useState([]);
-  const [users, setUsers] = useState([]);
+  const [users, setUsers] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const [nextCursor, setNextCursor] = useState(null);
+  // filters follows the form; appliedFilters is what the listed pages were fetched with
+  const [filters, setFilters] = useState(EMPTY_FILTERS);
+  const [appliedFilters, setAppliedFilters] = useState(EMPTY_FILTERS);
   const [dialogOpen, setDialogOpen] = useState(false);
   const [deleteDialog, setDeleteDialog] = useState({ open: false, licenseId: null });
   const [formData, setFormData] = useState({
@@ -38,20 +46,37 @@ export default function LicensesManager() {
     fetchData();
   }, []);
 
+  const licenseParams = (activeFilters, after) => {
+    const params = { limit: PAGE_SIZE, sort: 'created_at', order: 'desc', after };
+    if (activeFilters.client_name) params.client_name = activeFilters.client_name;
+    if (activeFilters.domain) params.domain = activeFilters.domain;
+    if (activeFilters.status !== 'all') params.status = activeFilters.status;
+    if (activeFilters.product_id !== 'all') params.product_id = activeFilters.product_id;
+    return params;
+  };
+
+  const fetchLicenses = async (activeFilters = appliedFilters) => {
+    const token = localStorage.getItem('token');
+    const page = await fetchPage(`${API}/licenses`, {
+      headers: { Authorization: `Bearer ${token}` },
+      params: licenseParams(activeFilters)
+    });
+    setLicenses(page.items);
+    setNextCursor(page.nextCursor);
+    setAppliedFilters(activeFilters);
+  };
+
   const fetchData = async () => {
     try {
       const token = localStorage.getItem('token');
       const headers = { Authorization: `Bearer ${token}` };
       
-      const [licensesRes, productsRes, usersRes] = await Promise.all([
-        axios.get(`${API}/licenses`, { headers }),
-        axios.get(`${API}/products`, { headers }),
-        axios.get(`${API}/users`, { headers })
+      const [, productsList] = await Promise.all([
+        fetchLicenses(),
+        fetchAllPages(`${API}/products`, { headers })
       ]);
       
-      setLicenses(licensesRes.data);
-      setProducts(productsRes.data);
-      setUsers(usersRes.data);
+      setProducts(productsList);
     } catch (error) {
       toast.error('Erro ao carregar dados');
     } finally {
@@ -59,6 +84,68 @@ export default function LicensesManager() {
     }
   };
 
+  // The user list is only needed by the form, so it is fetched the first time the dialog opens
+  const fetchUsers = async () => {
+    if (users !== null) return;
+    try {
+      const token = localStorage.getItem('token');
+      setUsers(await fetchAllPages(`${API}/users`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: { sort: 'email' }
+      }));
+    } catch (error) {
+      toast.error('Erro ao carregar usuários');
+    }
+  };
+
+  const openDialog = (open) => {
+    setDialogOpen(open);
+    if (open) fetchUsers();
+  };
+
+  const refreshLicenses = async () => {
+    try {
+      await fetchLicenses();
+    } catch (error) {
+      toast.error('Erro ao carregar licenças');
+    }
+  };
+
+  const handleFilter = async (e) => {
+    e.preventDefault();
+    try {
+      await fetchLicenses(filters);
+    } catch (error) {
+      toast.error(error.response?.data?.detail || 'Erro ao filtrar licenças');
+    }
+  };
+
+  const clearFilters = async () => {
+    setFilters(EMPTY_FILTERS);
+    try {
+      await fetchLicenses(EMPTY_FILTERS);
+    } catch (error) {
+      toast.error('Erro ao carregar licenças');
+    }
+  };
+
+  const loadMore = async () => {
+    const token = localStorage.getItem('token');
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(`${API}/licenses`, {
+        headers: { Authorization: `Bearer ${token}` },
+        params: licenseParams(appliedFilters, nextCursor)
+      });
+      setLicenses((current) => [...current, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      toast.error('Erro ao carregar licenças');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     const token = localStorage.getItem('token');
@@ -83,7 +170,7 @@ export default function LicensesManager() {
       
       setDialogOpen(false);
       resetForm();
-      fetchData();
+      refreshLicenses();
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Erro ao salvar licença');
     }
@@ -111,7 +198,7 @@ export default function LicensesManager() {
       status: license.status
     });
     setEditingId(license.id);
-    setDialogOpen(true);
+    openDialog(true);
   };
 
   const handleDelete = async () => {
@@ -123,7 +210,7 @@ export default function LicensesManager() {
       });
       toast.success('Licença deletada com sucesso!');
       setDeleteDialog({ open: false, licenseId: null });
-      fetchData();
+      refreshLicenses();
     } catch (error) {
       toast.error(error.response?.data?.detail || 'Erro ao deletar licença');
     }
@@ -156,7 +243,7 @@ export default function LicensesManager() {
           <h1 className="text-3xl font-bold text-slate-800 mb-2">Licenças</h1>
           <p className="text-slate-600">Gerencie as licenças do sistema</p>
         </div>
-        <Dialog open={dialogOpen} onOpenChange={setDialogOpen}>
+        <Dialog open={dialogOpen} onOpenChange={openDialog}>
           <DialogTrigger asChild>
             <Button onClick={resetForm} className="bg-gradient-to-r from-blue-500 to-indigo-600" data-testid="create-license-btn">
               <Plus className="w-4 h-4 mr-2" />
@@ -214,7 +301,7 @@ export default function LicensesManager() {
                       <SelectValue placeholder="Selecione um usuário" />
                     </SelectTrigger>
                     <SelectContent>
-                      {users.map((user) => (
+                      {(users || []).map((user) => (
                         <SelectItem key={user.id} value={user.id}>{user.email}</SelectItem>
                       ))}
                     </SelectContent>
@@ -258,6 +345,45 @@ export default function LicensesManager() {
         </Dialog>
       </div>
 
+      <form onSubmit={handleFilter} className="grid grid-cols-1 md:grid-cols-5 gap-3 mb-6" data-testid="license-filters">
+        <Input
+          placeholder="Cliente (começa com)"
+          value={filters.client_name}
+          onChange={(e) => setFilters({ ...filters, client_name: e.target.value })}
+        />
+        <Input
+          placeholder="Domínio"
+          value={filters.domain}
+          onChange={(e) => setFilters({ ...filters, domain: e.target.value })}
+        />
+        <Select value={filters.status} onValueChange={(value) => setFilters({ ...filters, status: value })}>
+          <SelectTrigger>
+            <SelectValue />
+          </SelectTrigger>
+          <SelectContent>
+            <SelectItem value="all">Todos os status</SelectItem>
+            <SelectItem value="active">Ativa</SelectItem>
+            <SelectItem value="inactive">Inativa</SelectItem>
+            <SelectItem value="expired">Expirada</SelectItem>
+          </SelectContent>
+        </Select>
+        <Select value={filters.product_id} onValueChange={(value) => setFilters({ ...filters, product_id: value })}>
+          <SelectTrigger>
+            <SelectValue />
+          </SelectTrigger>
+          <SelectContent>
+            <SelectItem value="all">Todos os produtos</SelectItem>
+            {products.map((product) => (
+              <SelectItem key={product.id} value={product.id}>{product.name}</SelectItem>
+            ))}
+          </SelectContent>
+        </Select>
+        <div className="flex gap-2">
+          <Button type="submit" className="flex-1" data-testid="license-filter-btn">Filtrar</Button>
+          <Button type="button" variant="outline" onClick={clearFilters}>Limpar</Button>
+        </div>
+      </form>
+
       <Card className="shadow-lg border-0">
         <CardContent className="p-0">
           {loading ? (
@@ -315,6 +441,13 @@ export default function LicensesManager() {
                   ))}
                 </TableBody>
               </Table>
+              {nextCursor && (
+                <div className="text-center py-4">
+                  <Button variant="outline" onClick={loadMore} disabled={loadingMore} data-testid="load-more-licenses-btn">
+                    {loadingMore ? 'Carregando...' : 'Carregar mais'}
+                  </Button>
+                </div>
+              )}
             </div>
           )}
         </CardContent>
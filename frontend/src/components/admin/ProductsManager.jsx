@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
+import { fetchAllPages } from '@/lib/pagination';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Label } from '@/components/ui/label';
@@ -20,7 +21,7 @@ export default function ProductsManager() {
   const [loading, setLoading] = useState(true);
   const [dialogOpen, setDialogOpen] = useState(false);
   const [deleteDialog, setDeleteDialog] = useState({ open: false, productId: null });
-  const [formData, setFormData] = useState({ name: '', description: '', version: '1.0.0' });
+  const [formData, setFormData] = useState({ name: '', description: '', version: '1.0.0', price: '' });
   const [editingId, setEditingId] = useState(null);
 
   useEffect(() => {
@@ -30,10 +31,10 @@ export default function ProductsManager() {
   const fetchProducts = async () => {
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get(`${API}/products`, {
+      const items = await fetchAllPages(`${API}/products`, {
         headers: { Authorization: `Bearer ${token}` }
       });
-      setProducts(response.data);
+      setProducts(items);
     } catch (error) {
       toast.error('Erro ao carregar produtos');
     } finally {
@@ -44,22 +45,23 @@ export default function ProductsManager() {
   const handleSubmit = async (e) => {
     e.preventDefault();
     const token = localStorage.getItem('token');
+    const payload = { ...formData, price: formData.price === '' ? null : Number(formData.price) };
 
     try {
       if (editingId) {
-        await axios.put(`${API}/products/${editingId}`, formData, {
+        await axios.put(`${API}/products/${editingId}`, payload, {
           headers: { Authorization: `Bearer ${token}` }
         });
         toast.success('Produto atualizado com sucesso!');
       } else {
-        await axios.post(`${API}/products`, formData, {
+        await axios.post(`${API}/products`, payload, {
           headers: { Authorization: `Bearer ${token}` }
         });
         toast.success('Produto criado com sucesso!');
       }
       
       setDialogOpen(false);
-      setFormData({ name: '', description: '', version: '1.0.0' });
+      setFormData({ name: '', description: '', version: '1.0.0', price: '' });
       setEditingId(null);
       fetchProducts();
     } catch (error) {
@@ -68,7 +70,7 @@ export default function ProductsManager() {
   };
 
   const handleEdit = (product) => {
-    setFormData({ name: product.name, description: product.description || '', version: product.version || '1.0.0' });
+    setFormData({ name: product.name, description: product.description || '', version: product.version || '1.0.0', price: product.price ?? '' });
     setEditingId(product.id);
     setDialogOpen(true);
   };
@@ -89,7 +91,7 @@ export default function ProductsManager() {
   };
 
   const openCreateDialog = () => {
-    setFormData({ name: '', description: '', version: '1.0.0' });
+    setFormData({ name: '', description: '', version: '1.0.0', price: '' });
     setEditingId(null);
     setDialogOpen(true);
   };
@@ -136,6 +138,19 @@ export default function ProductsManager() {
                   required
                 />
               </div>
+              <div className="space-y-2">
+                <Label htmlFor="price">Preço da renovação (R$)</Label>
+                <Input
+                  id="price"
+                  data-testid="product-price-input"
+                  type="number"
+                  min="0.01"
+                  step="0.01"
+                  value={formData.price}
+                  onChange={(e) => setFormData({ ...formData, price: e.target.value })}
+                  placeholder="Vazio: não vendido online"
+                />
+              </div>
               <div className="space-y-2">
                 <Label htmlFor="description">Descrição</Label>
                 <Input
@@ -0,0 +1,25 @@
+import axios from 'axios';
+
+// List endpoints return a plain array and send the next page cursor in this header
+const NEXT_CURSOR_HEADER = 'x-next-cursor';
+const MAX_PAGE_SIZE = 1000;
+
+export async function fetchPage(url, { headers, params } = {}) {
+  const response = await axios.get(url, { headers, params });
+  return {
+    items: response.data,
+    nextCursor: response.headers[NEXT_CURSOR_HEADER] || null
+  };
+}
+
+// Follows the cursor to the end; meant for small lists such as products or select options
+export async function fetchAllPages(url, { headers, params } = {}) {
+  const items = [];
+  let after;
+  do {
+    const page = await fetchPage(url, { headers, params: { limit: MAX_PAGE_SIZE, ...params, after } });
+    items.push(...page.items);
+    after = page.nextCursor;
+  } while (after);
+  return items;
+}
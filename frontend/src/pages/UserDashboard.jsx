@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react';
-import axios from 'axios';
+import { fetchAllPages } from '@/lib/pagination';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
@@ -22,10 +22,10 @@ export default function UserDashboard({ onLogout, user }) {
   const fetchLicenses = async () => {
     try {
       const token = localStorage.getItem('token');
-      const response = await axios.get(`${API}/licenses`, {
+      const items = await fetchAllPages(`${API}/licenses`, {
         headers: { Authorization: `Bearer ${token}` }
       });
-      setLicenses(response.data);
+      setLicenses(items);
     } catch (error) {
       toast.error('Erro ao carregar licenças');
     } finally {